@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from telethon.errors.rpcerrorlist import FloodWaitError, SlowModeWaitError
+from telethon.tl.types import Channel, Chat, ChatPhotoEmpty, User
+
+import program
+
+# Офлайн-замеры без живого аккаунта: ФейковыйКлиент повторяет ту часть TelegramClient,
+# которой пользуется program.py, с настраиваемыми задержками и ошибками ограничения
+
+class ФейковыйДиалог:
+    __slots__ = ('id', 'entity', 'date', 'pinned', 'unread_count')
+
+    def __init__(self, id_, сущность, дата, закреплён, непрочитано):
+        self.id = id_
+        self.entity = сущность
+        self.date = дата
+        self.pinned = закреплён
+        self.unread_count = непрочитано
+
+class ФейковоеСообщение:
+    __slots__ = ('id', 'date', 'message', 'sender_id', 'reply_to_msg_id', 'media')
+
+    def __init__(self, id_, дата, текст, отправитель):
+        self.id = id_
+        self.date = дата
+        self.message = текст
+        self.sender_id = отправитель
+        self.reply_to_msg_id = None
+        self.media = None
+
+    @property
+    def text(self):
+        return self.message
+
+class ФейковыйКлиент:
+    РАЗМЕР_СТРАНИЦЫ = 100
+
+    def __init__(self, диалогов: int, задержка: float = 0.0, доля_flood: float = 0.0,
+                 доля_slowmode: float = 0.0, секунды_ожидания: int = 1,
+                 сообщений_в_чате: int = 50, зерно: int = 0):
+        program.загрузить_telethon()
+        self.диалогов = диалогов
+        self.задержка = задержка
+        self.доля_flood = доля_flood
+        self.доля_slowmode = доля_slowmode
+        self.секунды_ожидания = секунды_ожидания
+        self.сообщений_в_чате = сообщений_в_чате
+        # Как у TelegramClient: ожидания не длиннее порога клиент проспит сам внутри запроса
+        self.flood_sleep_threshold = 60
+        self.проспано = 0.0
+        self.вызовы: Counter = Counter()
+        self.удалённые = set()
+        self._случай = random.Random(зерно)
+        self._начало = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    async def _rpc(self, метод: str, с_ограничениями: bool = False):
+        while True:
+            self.вызовы[метод] += 1
+            if self.задержка:
+                await asyncio.sleep(self.задержка)
+            if not с_ограничениями:
+                return
+            шанс = self._случай.random()
+            if шанс < self.доля_flood:
+                ошибка = FloodWaitError(request=None, capture=self.секунды_ожидания)
+            elif шанс < self.доля_flood + self.доля_slowmode:
+                ошибка = SlowModeWaitError(request=None, capture=self.секунды_ожидания)
+            else:
+                return
+            if ошибка.seconds > self.flood_sleep_threshold:
+                raise ошибка
+            self.проспано += ошибка.seconds
+            await asyncio.sleep(ошибка.seconds)
+
+    def _id(self, i: int) -> int:
+        вид = i % 4
+        if вид in (0, 1):
+            return -1000000000000 - i
+        if вид == 2:
+            return -i - 1
+        return i + 1
+
+    def _сущность(self, i: int):
+        вид = i % 4
+        фото = ChatPhotoEmpty()
+        if вид == 0:
+            return Channel(id=i, title=f"Канал {i}", photo=фото, date=None, broadcast=True)
+        if вид == 1:
+            return Channel(id=i, title=f"Супергруппа {i}", photo=фото, date=None, megagroup=True)
+        if вид == 2:
+            return Chat(id=i + 1, title=f"Группа {i}", photo=фото, participants_count=3, date=None, version=1)
+        return User(id=i + 1, first_name=f"Пользователь {i}", bot=(i % 8 == 7))
+
+    def _дата(self, i: int) -> datetime:
+        return self._начало - timedelta(minutes=i)
+
+    async def is_user_authorized(self) -> bool:
+        await self._rpc('is_user_authorized')
+        return True
+
+    async def get_me(self):
+        await self._rpc('get_me')
+        return User(id=0, is_self=True, first_name="Бенчмарк")
+
+    async def iter_dialogs(self, limit: Optional[int] = None):
+        выдано = 0
+        for i in range(self.диалогов):
+            if i % self.РАЗМЕР_СТРАНИЦЫ == 0:
+                await self._rpc('iter_dialogs')
+            id_ = self._id(i)
+            if id_ in self.удалённые:
+                continue
+            yield ФейковыйДиалог(id_, self._сущность(i), self._дата(i), i < 2, i % 5)
+            выдано += 1
+            if limit is not None and выдано >= limit:
+                return
+
+    async def delete_dialog(self, цель):
+        await self._rpc('delete_dialog', с_ограничениями=True)
+        self.удалённые.add(цель)
+
+    async def get_messages(self, цель, limit: int = 1, offset_id: int = 0, reverse: bool = False, **_):
+        await self._rpc('get_messages', с_ограничениями=True)
+        всего = self.сообщений_в_чате
+        if reverse:
+            ids = range(offset_id + 1, min(всего, offset_id + limit) + 1)
+        else:
+            верх = (offset_id - 1) if offset_id else всего
+            ids = range(верх, max(0, верх - limit), -1)
+        return [ФейковоеСообщение(id_, self._начало + timedelta(seconds=id_), f"Сообщение {id_}", 1) for id_ in ids]
+
+class Замер:
+    def __init__(self, клиент: Optional[ФейковыйКлиент] = None):
+        self.клиент = клиент
+
+    def __enter__(self):
+        self._вызовы = sum(self.клиент.вызовы.values()) if self.клиент else 0
+        tracemalloc.start()
+        self._старт = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.секунд = time.perf_counter() - self._старт
+        self.пик_памяти = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.rpc = (sum(self.клиент.вызовы.values()) - self._вызовы) if self.клиент else 0
+
+async def замерить(размер: int, аргументы: argparse.Namespace, каталог: Path) -> List[dict]:
+    результаты = []
+
+    def записать(сценарий: str, замер: Замер, **дополнительно):
+        результаты.append({
+            "dialogs": размер, "scenario": сценарий, "seconds": round(замер.секунд, 4),
+            "rpc": замер.rpc, "peak_kib": замер.пик_памяти // 1024, **дополнительно
+        })
+
+    клиент = ФейковыйКлиент(размер, задержка=аргументы.latency)
+    индекс = program.ИндексДиалогов(каталог / f"bench_{размер}.dialogs.db")
+
+    with Замер(клиент) as замер:
+        async for диалог in клиент.iter_dialogs():
+            program.запись_из_диалога(диалог)
+    записать("classify", замер)
+
+    with Замер(клиент) as замер:
+        записано = await индекс.обновить(клиент, полностью=True)
+    записать("index_full_sync", замер, rows=записано)
+
+    with Замер(клиент) as замер:
+        записано = await индекс.обновить(клиент)
+    записать("index_incremental_sync", замер, rows=записано)
+
+    with Замер() as замер:
+        индекс.страница('каналы', 'название', 0, 50)
+    записать("list_first_page", замер)
+
+    with Замер() as замер:
+        поиск = program.ИндексПоиска(индекс.записи('личные'))
+    записать("picker_build", замер, entries=len(поиск))
+
+    запросы = ["польз", "99", "ль 12", "пользователь 4", "x"]
+    with Замер() as замер:
+        for запрос in запросы:
+            поиск.найти(запрос)
+    записать("picker_query", замер, queries=len(запросы))
+
+    цели = индекс.идентификаторы('боты')[:аргументы.cleanup_targets]
+    клиент_очистки = ФейковыйКлиент(
+        размер, задержка=аргументы.latency, доля_flood=аргументы.flood_rate,
+        доля_slowmode=аргументы.slowmode_rate, секунды_ожидания=аргументы.flood_seconds
+    )
+    регулятор = program.РегуляторСкорости(клиент=клиент_очистки)
+    with Замер(клиент_очистки) as замер:
+        успешных, ошибок = await регулятор.выполнить(цели, клиент_очистки.delete_dialog)
+    записать("cleanup", замер, targets=len(цели), ok=успешных, failed=ошибок,
+             flood_wait_seconds=round(регулятор.ожидание_flood, 2), client_slept_seconds=клиент_очистки.проспано)
+
+    цели = индекс.идентификаторы('личные')[:аргументы.archive_targets]
+    клиент_архива = ФейковыйКлиент(
+        размер, задержка=аргументы.latency, доля_flood=аргументы.flood_rate,
+        секунды_ожидания=аргументы.flood_seconds, сообщений_в_чате=аргументы.archive_messages
+    )
+    архив = program.АрхивЧатов(f"bench_{размер}")
+    архив.каталог = каталог / "archive" / str(размер)
+    with Замер(клиент_архива) as замер:
+        успешных, ошибок = await program.РегуляторСкорости(клиент=клиент_архива).выполнить(
+            цели, program.создать_операцию_очистки(клиент_архива, архив)
+        )
+    записать("cleanup_archive", замер, targets=len(цели), ok=успешных, failed=ошибок, messages=архив.сообщений)
+
+    индекс.закрыть()
+    return результаты
+
+def разобрать_аргументы(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    парсер = argparse.ArgumentParser(description="Офлайн-бенчмарк program.py на фейковом клиенте Telegram")
+    парсер.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="количество диалогов")
+    парсер.add_argument('--latency', type=float, default=0.002, help="задержка одного RPC, сек")
+    парсер.add_argument('--flood-rate', type=float, default=0.01, help="доля delete_dialog с FloodWaitError")
+    парсер.add_argument('--slowmode-rate', type=float, default=0.0, help="доля delete_dialog с SlowModeWaitError")
+    парсер.add_argument('--flood-seconds', type=int, default=1, help="секунды ожидания в ошибках ограничения")
+    парсер.add_argument('--cleanup-targets', type=int, default=500, help="сколько ботов удалять в сценарии cleanup")
+    парсер.add_argument('--archive-targets', type=int, default=20, help="сколько личных чатов архивировать перед удалением")
+    парсер.add_argument('--archive-messages', type=int, default=2000, help="сообщений в каждом архивируемом чате")
+    парсер.add_argument('--json', action='store_true', help="вывод в JSON Lines")
+    return парсер.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    аргументы = разобрать_аргументы(argv)
+    with tempfile.TemporaryDirectory() as каталог:
+        for размер in аргументы.sizes:
+            for результат in asyncio.run(замерить(размер, аргументы, Path(каталог))):
+                if аргументы.json:
+                    print(json.dumps(результат, ensure_ascii=False))
+                else:
+                    дополнительно = " ".join(
+                        f"{к}={з}" for к, з in результат.items()
+                        if к not in ("dialogs", "scenario", "seconds", "rpc", "peak_kib")
+                    )
+                    print(f"{результат['dialogs']:>7} {результат['scenario']:<24} {результат['seconds']:>9.4f}s "
+                          f"rpc={результат['rpc']:<6} peak={результат['peak_kib']}KiB {дополнительно}")
+                sys.stdout.flush()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,72 @@
+import argparse
 import asyncio
+import bisect
+import contextlib
+import csv
+import gzip
 import json
+import math
+import os
 import sys
 import re
+import sqlite3
 import time
+from array import array
+from collections import OrderedDict, deque
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional, List
-
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.text import Text as RichText
-from rich import box
-from rich.live import Live
-import questionary
-from questionary import Separator
-
-from telethon.sync import TelegramClient
-from telethon.tl.types import Channel, User, Chat
-from telethon.errors.rpcerrorlist import (
-    SlowModeWaitError, FloodWaitError, SessionPasswordNeededError,
-    ApiIdInvalidError, PhoneNumberInvalidError, PeerIdInvalidError
-)
-
-CONSOLE = Console()
+from datetime import datetime
+from typing import Optional, List, Iterator, Iterable, Dict, Callable, Awaitable
+
 ACCOUNTS_FILE = Path('accounts.json')
 SESSIONS_DIR = Path('sessions')
-SESSIONS_DIR.mkdir(exist_ok=True)
-
-CUSTOM_STYLE = questionary.Style([
-    ('qmark', 'fg:#4fc3f7 bold'),
-    ('question', 'bold fg:#29b6f6'),
-    ('selected', 'fg:#ff7043'),
-    ('pointer', 'fg:#0288d1 bold'),
-    ('answer', 'fg:#4fc3f7 bold'),
-])
+JOURNALS_DIR = SESSIONS_DIR / 'journals'
+ARCHIVE_DIR = SESSIONS_DIR / 'archive'
+METRICS_FILE = SESSIONS_DIR / 'metrics.jsonl'
+
+# rich/questionary и telethon импортируются только на том пути, где они нужны:
+# команды без меню, читающие индекс, не загружают ни интерфейс, ни клиент
+CONSOLE = None
+CUSTOM_STYLE = None
+_TELETHON_ЗАГРУЖЕН = False
+
+def загрузить_интерфейс():
+    global CONSOLE, CUSTOM_STYLE, Console, Panel, Table, RichText, box, Live, questionary, Separator
+    if CONSOLE is not None:
+        return
+    from rich.console import Console
+    from rich.panel import Panel
+    from rich.table import Table
+    from rich.text import Text as RichText
+    from rich import box
+    from rich.live import Live
+    import questionary
+    from questionary import Separator
+
+    CONSOLE = Console()
+    CUSTOM_STYLE = questionary.Style([
+        ('qmark', 'fg:#4fc3f7 bold'),
+        ('question', 'bold fg:#29b6f6'),
+        ('selected', 'fg:#ff7043'),
+        ('pointer', 'fg:#0288d1 bold'),
+        ('answer', 'fg:#4fc3f7 bold'),
+    ])
+
+def загрузить_telethon():
+    global _TELETHON_ЗАГРУЖЕН, events, utils, TelegramClient, Channel, User, Chat, PeerChannel, UpdateChannel
+    global SlowModeWaitError, FloodWaitError, SessionPasswordNeededError, ApiIdInvalidError
+    global PhoneNumberInvalidError, PeerIdInvalidError, ChannelPrivateError, ServerError
+    if _TELETHON_ЗАГРУЖЕН:
+        return
+    from telethon import events, utils
+    from telethon.sync import TelegramClient
+    from telethon.tl.types import Channel, User, Chat, PeerChannel, UpdateChannel
+    from telethon.errors.rpcerrorlist import (
+        SlowModeWaitError, FloodWaitError, SessionPasswordNeededError,
+        ApiIdInvalidError, PhoneNumberInvalidError, PeerIdInvalidError, ChannelPrivateError
+    )
+    from telethon.errors import ServerError
+    _TELETHON_ЗАГРУЖЕН = True
 
 EMOJI = {
     'успех': '[✅]',
@@ -69,17 +101,20 @@ class КонтроллерСпама:
         self.цель: Optional[str] = None
         self.сообщение: Optional[str] = None
 
+def загрузить_аккаунты() -> List[Аккаунт]:
+    if not ACCOUNTS_FILE.exists():
+        return []
+    with ACCOUNTS_FILE.open('r', encoding='utf-8') as f:
+        return [Аккаунт(**акк) for акк in json.load(f)]
+
 class МенеджерАккаунтов:
-    def __init__(self):
+    def __init__(self, пул: Optional['ПулКлиентов'] = None):
         self.аккаунты: List[Аккаунт] = self._загрузить()
+        self.пул = пул
 
     def _загрузить(self) -> List[Аккаунт]:
-        if not ACCOUNTS_FILE.exists():
-            return []
         try:
-            with ACCOUNTS_FILE.open('r', encoding='utf-8') as f:
-                данные = json.load(f)
-                return [Аккаунт(**акк) for акк in данные]
+            return загрузить_аккаунты()
         except (json.JSONDecodeError, IOError, TypeError):
             CONSOLE.print(Panel(f"{EMOJI['ошибка']} [bold red]Ошибка: Не удалось прочитать файл 'accounts.json'[/bold red]", border_style="red"))
             return []
@@ -158,13 +193,1213 @@ class МенеджерАккаунтов:
         варианты = [{"name": акк.телефон, "value": акк} for акк in self.аккаунты] + [{"name": f"{EMOJI['назад']} Отмена", "value": None}]
         акк = await questionary.select("Выберите аккаунт для удаления:", choices=варианты, style=CUSTOM_STYLE).ask_async()
         if акк and await questionary.confirm(f"Удалить {акк.телефон} и сессию?", style=CUSTOM_STYLE).ask_async():
+            if self.пул:
+                await self.пул.закрыть(акк.имя_сессии)
             файл_сессии = SESSIONS_DIR / f"{акк.имя_сессии}.session"
             файл_сессии.unlink(missing_ok=True)
+            (SESSIONS_DIR / f"{акк.имя_сессии}.dialogs.db").unlink(missing_ok=True)
             self.аккаунты.remove(акк)
             self._сохранить()
             CONSOLE.print(Panel(f"{EMOJI['успех']} [green]Аккаунт удалён.[/green]", border_style="green"))
             await asyncio.sleep(1.5)
 
+class ЗаписьДиалога:
+    # Компактная запись вместо живых объектов Dialog/сущностей Telethon
+    __slots__ = ('id', 'тип', 'название', 'бот', 'мегагруппа', 'непрочитано', 'дата', 'заглушен')
+
+    def __init__(self, id_: int, тип: str, название: str, бот: bool = False,
+                 мегагруппа: bool = False, непрочитано: int = 0, дата: float = 0.0, заглушен: bool = False):
+        self.id = id_
+        self.тип = тип
+        self.название = название
+        self.бот = бот
+        self.мегагруппа = мегагруппа
+        self.непрочитано = непрочитано
+        self.дата = дата
+        self.заглушен = заглушен
+
+    def как_строка(self) -> tuple:
+        return (self.id, self.тип, self.название, int(self.бот), int(self.мегагруппа),
+                self.непрочитано, self.дата, int(self.заглушен))
+
+def классифицировать(сущность) -> Optional[tuple]:
+    # Единственное место, где сущность Telethon превращается в тип диалога и название
+    if isinstance(сущность, Channel):
+        return ('группы' if сущность.megagroup else 'каналы'), сущность.title or "Без названия"
+    if isinstance(сущность, Chat):
+        return 'группы', сущность.title or "Без названия"
+    if isinstance(сущность, User):
+        if сущность.bot:
+            return 'боты', сущность.first_name or "Бот"
+        if not сущность.is_self:
+            return 'личные', f"{сущность.first_name or ''} {сущность.last_name or ''}".strip() or "Без имени"
+    return None
+
+def заглушен(диалог) -> bool:
+    настройки = getattr(getattr(диалог, 'dialog', None), 'notify_settings', None)
+    до = getattr(настройки, 'mute_until', None)
+    return bool(до) and до.timestamp() > time.time()
+
+def запись_из_диалога(диалог) -> Optional[ЗаписьДиалога]:
+    сущность = диалог.entity
+    класс = классифицировать(сущность)
+    if not класс:
+        return None
+    тип, название = класс
+    return ЗаписьДиалога(
+        диалог.id, тип, название,
+        бот=bool(getattr(сущность, 'bot', False)),
+        мегагруппа=bool(getattr(сущность, 'megagroup', False)),
+        непрочитано=диалог.unread_count or 0,
+        заглушен=заглушен(диалог),
+        дата=диалог.date.timestamp() if диалог.date else 0.0
+    )
+
+class Фильтр:
+    # Разобранный запрос вида `kind=channel and last_activity>180d and unread=0`,
+    # скомпилированный в условие WHERE для таблицы dialogs
+    ТОКЕН = re.compile(r"""\s*(?:
+        (?P<скобка>[()])
+      | (?P<оп>=~|!~|!=|>=|<=|=|<|>|~)
+      | (?P<строка>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<слово>[^\s()=!<>~"']+)
+    )""", re.VERBOSE)
+    ТИПЫ = {
+        'channel': 'каналы', 'channels': 'каналы', 'канал': 'каналы', 'каналы': 'каналы',
+        'group': 'группы', 'groups': 'группы', 'группа': 'группы', 'группы': 'группы',
+        'private': 'личные', 'user': 'личные', 'users': 'личные', 'личные': 'личные',
+        'bot': 'боты', 'bots': 'боты', 'бот': 'боты', 'боты': 'боты',
+    }
+    ЕДИНИЦЫ = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+    ЧИСЛОВЫЕ = {'id': 'id', 'unread': 'unread'}
+    ЛОГИЧЕСКИЕ = {'muted': 'muted', 'bot': 'bot', 'megagroup': 'megagroup'}
+    СРАВНЕНИЯ = {'=': '=', '!=': '!=', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+
+    def __init__(self, текст: str):
+        self.текст = текст
+        self._токены = self._разбить(текст)
+        self._поз = 0
+        self.условие, параметры = self._или()
+        if self._поз < len(self._токены):
+            raise ValueError(f"Лишнее в конце запроса: {self._токены[self._поз][1]}")
+        self.параметры = tuple(параметры)
+
+    @classmethod
+    def _разбить(cls, текст: str) -> List[tuple]:
+        токены, поз = [], 0
+        текст = текст.rstrip()
+        while поз < len(текст):
+            совпадение = cls.ТОКЕН.match(текст, поз)
+            if not совпадение or совпадение.end() == поз:
+                raise ValueError(f"Не удалось разобрать запрос с позиции {поз + 1}: {текст[поз:]}")
+            вид = совпадение.lastgroup
+            значение = совпадение.group(вид)
+            if вид == 'строка':
+                # снимаем экранирование только с кавычки, чтобы \d и прочее доходило до регулярок
+                значение = значение[1:-1].replace('\\' + значение[0], значение[0])
+            токены.append((вид, значение))
+            поз = совпадение.end()
+        return токены
+
+    def _следующий(self) -> Optional[tuple]:
+        return self._токены[self._поз] if self._поз < len(self._токены) else None
+
+    def _взять(self, вид: str) -> str:
+        токен = self._следующий()
+        if токен is None or токен[0] not in вид.split('|'):
+            raise ValueError(f"Ожидалось {вид}, а получено {токен[1] if токен else 'конец запроса'}")
+        self._поз += 1
+        return токен[1]
+
+    def _ключевое(self, слово: str) -> bool:
+        токен = self._следующий()
+        if токен and токен[0] == 'слово' and токен[1].lower() == слово:
+            self._поз += 1
+            return True
+        return False
+
+    def _или(self):
+        условие, параметры = self._и()
+        while self._ключевое('or'):
+            правое, ещё = self._и()
+            условие, параметры = f"({условие} OR {правое})", параметры + ещё
+        return условие, параметры
+
+    def _и(self):
+        условие, параметры = self._не()
+        while self._ключевое('and'):
+            правое, ещё = self._не()
+            условие, параметры = f"({условие} AND {правое})", параметры + ещё
+        return условие, параметры
+
+    def _не(self):
+        if self._ключевое('not'):
+            условие, параметры = self._не()
+            return f"(NOT {условие})", параметры
+        токен = self._следующий()
+        if токен and токен == ('скобка', '('):
+            self._поз += 1
+            условие, параметры = self._или()
+            if self._взять('скобка') != ')':
+                raise ValueError("Ожидалась закрывающая скобка")
+            return условие, параметры
+        return self._сравнение()
+
+    def _сравнение(self):
+        поле = self._взять('слово').lower()
+        оп = self._взять('оп')
+        значение = self._взять('слово|строка')
+
+        if поле in ('kind', 'type'):
+            тип = self.ТИПЫ.get(значение.lower())
+            if тип is None or оп not in ('=', '!='):
+                raise ValueError("kind поддерживает = и != со значениями channel, group, private, bot")
+            return f"kind {оп} ?", [тип]
+
+        if поле in ('title', 'name'):
+            if оп == '=~':
+                try:
+                    re.compile(значение)
+                except re.error as e:
+                    raise ValueError(f"Неверное регулярное выражение: {e}")
+                return "title REGEXP ?", [значение]
+            if оп in ('~', '!~'):
+                отрицание = "= 0" if оп == '!~' else "> 0"
+                return f"instr(py_lower(title), ?) {отрицание}", [значение.lower()]
+            if оп in ('=', '!='):
+                return f"py_lower(title) {оп} ?", [значение.lower()]
+            raise ValueError("title поддерживает =, !=, ~ (подстрока), !~ и =~ (регулярное выражение)")
+
+        if поле in ('last_activity', 'activity', 'age'):
+            # last_activity>180d — последняя активность была больше 180 дней назад
+            if оп not in ('<', '>', '<=', '>='):
+                raise ValueError("last_activity сравнивается через <, >, <=, >= с длительностью, например 180d")
+            граница = time.time() - self._длительность(значение)
+            обратный = {'>': '<', '<': '>', '>=': '<=', '<=': '>='}[оп]
+            if оп in ('>', '>='):
+                # date = 0 — активность неизвестна (например, канал без сообщений), такие чаты
+                # не считаются неактивными, как и в статистике
+                return f"(date > 0 AND date {обратный} ?)", [граница]
+            return f"date {обратный} ?", [граница]
+
+        if поле in self.ЧИСЛОВЫЕ:
+            if оп not in self.СРАВНЕНИЯ:
+                raise ValueError(f"{поле} сравнивается через =, !=, <, >, <=, >=")
+            try:
+                число = int(значение)
+            except ValueError:
+                raise ValueError(f"{поле}: ожидалось целое число, а получено {значение}")
+            return f"{self.ЧИСЛОВЫЕ[поле]} {self.СРАВНЕНИЯ[оп]} ?", [число]
+
+        if поле in self.ЛОГИЧЕСКИЕ:
+            if оп not in ('=', '!='):
+                raise ValueError(f"{поле} поддерживает только = и !=")
+            истина = значение.lower() in ('1', 'true', 'yes', 'да')
+            if not истина and значение.lower() not in ('0', 'false', 'no', 'нет'):
+                raise ValueError(f"{поле}: ожидалось true или false")
+            return f"{self.ЛОГИЧЕСКИЕ[поле]} {оп} ?", [int(истина)]
+
+        raise ValueError(f"Неизвестное поле: {поле}")
+
+    @classmethod
+    def _длительность(cls, значение: str) -> float:
+        совпадение = re.fullmatch(r'(\d+(?:\.\d+)?)([smhdwy]?)', значение.lower())
+        if not совпадение:
+            raise ValueError(f"Неверная длительность: {значение} (пример: 30d, 12h, 2w)")
+        return float(совпадение.group(1)) * cls.ЕДИНИЦЫ[совпадение.group(2) or 'd']
+
+class ИндексДиалогов:
+    # Локальная копия списка диалогов сессии, чтобы не перечитывать iter_dialogs на каждое действие
+    # Пакет совпадает со страницей GetDialogs, чтобы первые записи были видны сразу после первого запроса
+    РАЗМЕР_ПАКЕТА = 100
+    КОЛОНКИ = "id, kind, title, bot, megagroup, unread, date, muted"
+    ВЕРСИЯ_СХЕМЫ = 3
+    СОРТИРОВКИ = {
+        'дата': "date DESC",
+        'название': "title COLLATE NOCASE, id",
+        'id': "id",
+    }
+
+    def __init__(self, путь: Path):
+        self.путь = путь
+        путь.parent.mkdir(parents=True, exist_ok=True)
+        self.бд = sqlite3.connect(str(путь))
+        # lower() в SQLite понимает только ASCII, а названия бывают на любом языке
+        self.бд.create_function("py_lower", 1, lambda текст: текст.lower() if текст is not None else None, deterministic=True)
+        self.бд.create_function(
+            "REGEXP", 2, lambda шаблон, текст: текст is not None and re.search(шаблон, текст) is not None, deterministic=True
+        )
+        self.бд.executescript("""
+            CREATE TABLE IF NOT EXISTS dialogs (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                title TEXT NOT NULL,
+                bot INTEGER NOT NULL DEFAULT 0,
+                megagroup INTEGER NOT NULL DEFAULT 0,
+                unread INTEGER NOT NULL DEFAULT 0,
+                date REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS dialogs_kind_date ON dialogs (kind, date DESC);
+            CREATE INDEX IF NOT EXISTS dialogs_kind_title ON dialogs (kind, title COLLATE NOCASE);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self.бд.commit()
+        self._мигрировать()
+        # Версия по типу растёт только при изменении состава или названий, чтобы поиск по чатам не
+        # перестраивался от каждого нового сообщения. Временные триггеры живут только в этом соединении
+        self._версии_типов: Dict[str, int] = {}
+        self.бд.create_function("kind_changed", 1, self._изменён_тип)
+        self.бд.executescript("""
+            CREATE TEMP TRIGGER dialogs_names_insert AFTER INSERT ON dialogs BEGIN
+                SELECT kind_changed(NEW.kind);
+            END;
+            CREATE TEMP TRIGGER dialogs_names_delete AFTER DELETE ON dialogs BEGIN
+                SELECT kind_changed(OLD.kind);
+            END;
+            CREATE TEMP TRIGGER dialogs_names_update AFTER UPDATE OF kind, title ON dialogs
+                WHEN OLD.kind IS NOT NEW.kind OR OLD.title IS NOT NEW.title BEGIN
+                SELECT kind_changed(OLD.kind);
+                SELECT kind_changed(NEW.kind);
+            END;
+        """)
+
+    def _изменён_тип(self, тип: str):
+        self._версии_типов[тип] = self._версии_типов.get(тип, 0) + 1
+
+    def версия(self, тип: str) -> int:
+        return self._версии_типов.get(тип, 0)
+
+    def _мигрировать(self):
+        версия = self.бд.execute("PRAGMA user_version").fetchone()[0]
+        if версия < 1:
+            # Агрегаты для статистики поддерживаются триггерами при каждом изменении dialogs,
+            # поэтому сводка не требует обхода всех диалогов
+            self.бд.executescript("""
+                BEGIN;
+                ALTER TABLE dialogs ADD COLUMN muted INTEGER NOT NULL DEFAULT 0;
+                CREATE INDEX dialogs_date ON dialogs (date);
+                CREATE TABLE stats_kind (
+                    kind TEXT PRIMARY KEY, count INTEGER NOT NULL, unread INTEGER NOT NULL, muted INTEGER NOT NULL
+                );
+                CREATE TABLE stats_day (
+                    kind TEXT NOT NULL, day INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kind, day)
+                );
+                INSERT INTO stats_kind SELECT kind, COUNT(*), SUM(unread), SUM(muted) FROM dialogs GROUP BY kind;
+                INSERT INTO stats_day SELECT kind, CAST(date / 86400 AS INTEGER), COUNT(*) FROM dialogs GROUP BY 1, 2;
+
+                PRAGMA user_version = 1;
+                COMMIT;
+            """)
+        if версия < 2:
+            # INSERT OR IGNORE внутри триггера уступает политике внешнего upsert,
+            # поэтому недостающие строки агрегатов добавляются через NOT EXISTS
+            self.бд.executescript("""
+                BEGIN;
+                DROP TRIGGER IF EXISTS dialogs_stats_insert;
+                DROP TRIGGER IF EXISTS dialogs_stats_delete;
+                DROP TRIGGER IF EXISTS dialogs_stats_update;
+                CREATE TRIGGER dialogs_stats_insert AFTER INSERT ON dialogs BEGIN
+                    INSERT INTO stats_kind SELECT NEW.kind, 0, 0, 0
+                        WHERE NOT EXISTS (SELECT 1 FROM stats_kind WHERE kind = NEW.kind);
+                    UPDATE stats_kind SET count = count + 1, unread = unread + NEW.unread, muted = muted + NEW.muted
+                        WHERE kind = NEW.kind;
+                    INSERT INTO stats_day SELECT NEW.kind, CAST(NEW.date / 86400 AS INTEGER), 0 WHERE NOT EXISTS (
+                        SELECT 1 FROM stats_day WHERE kind = NEW.kind AND day = CAST(NEW.date / 86400 AS INTEGER)
+                    );
+                    UPDATE stats_day SET count = count + 1
+                        WHERE kind = NEW.kind AND day = CAST(NEW.date / 86400 AS INTEGER);
+                END;
+                CREATE TRIGGER dialogs_stats_delete AFTER DELETE ON dialogs BEGIN
+                    UPDATE stats_kind SET count = count - 1, unread = unread - OLD.unread, muted = muted - OLD.muted
+                        WHERE kind = OLD.kind;
+                    UPDATE stats_day SET count = count - 1
+                        WHERE kind = OLD.kind AND day = CAST(OLD.date / 86400 AS INTEGER);
+                    DELETE FROM stats_day WHERE count <= 0;
+                END;
+                CREATE TRIGGER dialogs_stats_update AFTER UPDATE OF kind, unread, date, muted ON dialogs BEGIN
+                    UPDATE stats_kind SET count = count - 1, unread = unread - OLD.unread, muted = muted - OLD.muted
+                        WHERE kind = OLD.kind;
+                    INSERT INTO stats_kind SELECT NEW.kind, 0, 0, 0
+                        WHERE NOT EXISTS (SELECT 1 FROM stats_kind WHERE kind = NEW.kind);
+                    UPDATE stats_kind SET count = count + 1, unread = unread + NEW.unread, muted = muted + NEW.muted
+                        WHERE kind = NEW.kind;
+                    UPDATE stats_day SET count = count - 1
+                        WHERE kind = OLD.kind AND day = CAST(OLD.date / 86400 AS INTEGER);
+                    INSERT INTO stats_day SELECT NEW.kind, CAST(NEW.date / 86400 AS INTEGER), 0 WHERE NOT EXISTS (
+                        SELECT 1 FROM stats_day WHERE kind = NEW.kind AND day = CAST(NEW.date / 86400 AS INTEGER)
+                    );
+                    UPDATE stats_day SET count = count + 1
+                        WHERE kind = NEW.kind AND day = CAST(NEW.date / 86400 AS INTEGER);
+                    DELETE FROM stats_day WHERE count <= 0;
+                END;
+                PRAGMA user_version = 2;
+                COMMIT;
+            """)
+        if версия < 3:
+            # Пустая строка stats_day удаляется только для изменённого дня, а не поиском по всей таблице
+            self.бд.executescript("""
+                BEGIN;
+                DROP TRIGGER dialogs_stats_delete;
+                DROP TRIGGER dialogs_stats_update;
+                CREATE TRIGGER dialogs_stats_delete AFTER DELETE ON dialogs BEGIN
+                    UPDATE stats_kind SET count = count - 1, unread = unread - OLD.unread, muted = muted - OLD.muted
+                        WHERE kind = OLD.kind;
+                    UPDATE stats_day SET count = count - 1
+                        WHERE kind = OLD.kind AND day = CAST(OLD.date / 86400 AS INTEGER);
+                    DELETE FROM stats_day
+                        WHERE kind = OLD.kind AND day = CAST(OLD.date / 86400 AS INTEGER) AND count <= 0;
+                END;
+                CREATE TRIGGER dialogs_stats_update AFTER UPDATE OF kind, unread, date, muted ON dialogs BEGIN
+                    UPDATE stats_kind SET count = count - 1, unread = unread - OLD.unread, muted = muted - OLD.muted
+                        WHERE kind = OLD.kind;
+                    INSERT INTO stats_kind SELECT NEW.kind, 0, 0, 0
+                        WHERE NOT EXISTS (SELECT 1 FROM stats_kind WHERE kind = NEW.kind);
+                    UPDATE stats_kind SET count = count + 1, unread = unread + NEW.unread, muted = muted + NEW.muted
+                        WHERE kind = NEW.kind;
+                    UPDATE stats_day SET count = count - 1
+                        WHERE kind = OLD.kind AND day = CAST(OLD.date / 86400 AS INTEGER);
+                    INSERT INTO stats_day SELECT NEW.kind, CAST(NEW.date / 86400 AS INTEGER), 0 WHERE NOT EXISTS (
+                        SELECT 1 FROM stats_day WHERE kind = NEW.kind AND day = CAST(NEW.date / 86400 AS INTEGER)
+                    );
+                    UPDATE stats_day SET count = count + 1
+                        WHERE kind = NEW.kind AND day = CAST(NEW.date / 86400 AS INTEGER);
+                    DELETE FROM stats_day
+                        WHERE kind = OLD.kind AND day = CAST(OLD.date / 86400 AS INTEGER) AND count <= 0;
+                END;
+                PRAGMA user_version = 3;
+                COMMIT;
+            """)
+
+    def _зафиксировать(self):
+        self.бд.commit()
+
+    def последняя_дата(self) -> float:
+        строка = self.бд.execute("SELECT value FROM meta WHERE key = 'last_date'").fetchone()
+        return float(строка[0]) if строка else 0.0
+
+    def синхронизирован(self) -> bool:
+        return self.бд.execute("SELECT 1 FROM meta WHERE key = 'last_date'").fetchone() is not None
+
+    def _записать(self, записи: List[ЗаписьДиалога]):
+        self.бд.executemany(
+            f"""INSERT INTO dialogs ({self.КОЛОНКИ}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET kind = excluded.kind, title = excluded.title, bot = excluded.bot,
+                   megagroup = excluded.megagroup, unread = excluded.unread, date = excluded.date,
+                   muted = excluded.muted""",
+            (запись.как_строка() for запись in записи)
+        )
+
+    async def обновить(self, клиент, полностью: bool = False,
+                       при_пакете: Optional[Callable[[], None]] = None) -> int:
+        # iter_dialogs отдаёт диалоги от новых к старым (после закреплённых), поэтому
+        # при инкрементальном обновлении останавливаемся на первом неизменённом диалоге
+        граница = 0.0 if полностью else self.последняя_дата()
+        новая_граница = граница
+        увиденные = set()
+        пакет = []
+        обновлено = 0
+
+        async for диалог in клиент.iter_dialogs():
+            дата = диалог.date.timestamp() if диалог.date else 0.0
+            # Диалог без сообщений (дата 0) ничего не говорит о порядке и точкой остановки не служит
+            if граница and not диалог.pinned and дата and дата < граница:
+                break
+            новая_граница = max(новая_граница, дата)
+            увиденные.add(диалог.id)
+            запись = запись_из_диалога(диалог)
+            if запись:
+                пакет.append(запись)
+            if len(пакет) >= self.РАЗМЕР_ПАКЕТА:
+                self._записать(пакет)
+                self._зафиксировать()
+                обновлено += len(пакет)
+                пакет = []
+                if при_пакете:
+                    при_пакете()
+
+        if пакет:
+            self._записать(пакет)
+            обновлено += len(пакет)
+
+        if полностью:
+            # Диалоги, которых больше нет в аккаунте, при полной синхронизации убираем из индекса
+            self.бд.execute("CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)")
+            self.бд.execute("DELETE FROM seen")
+            self.бд.executemany("INSERT INTO seen (id) VALUES (?)", ((id_,) for id_ in увиденные))
+            self.бд.execute("DELETE FROM dialogs WHERE id NOT IN (SELECT id FROM seen)")
+            self.бд.execute("DELETE FROM seen")
+
+        self.бд.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_date', ?)", (str(новая_граница),)
+        )
+        self._зафиксировать()
+        return обновлено
+
+    def записи(self, тип: Optional[str] = None) -> Iterator[ЗаписьДиалога]:
+        if тип is None:
+            курсор = self.бд.execute(
+                f"SELECT {self.КОЛОНКИ} FROM dialogs ORDER BY date DESC"
+            )
+        else:
+            курсор = self.бд.execute(
+                f"SELECT {self.КОЛОНКИ} FROM dialogs WHERE kind = ? ORDER BY date DESC",
+                (тип,)
+            )
+        for строка in курсор:
+            yield ЗаписьДиалога(*строка)
+
+    def количество(self, тип: str) -> int:
+        строка = self.бд.execute("SELECT count FROM stats_kind WHERE kind = ?", (тип,)).fetchone()
+        return строка[0] if строка else 0
+
+    def страница(self, тип: str, сортировка: str, смещение: int, лимит: int) -> List[ЗаписьДиалога]:
+        порядок = self.СОРТИРОВКИ[сортировка]
+        курсор = self.бд.execute(
+            f"SELECT {self.КОЛОНКИ} FROM dialogs WHERE kind = ? "
+            f"ORDER BY {порядок} LIMIT ? OFFSET ?",
+            (тип, лимит, смещение)
+        )
+        return [ЗаписьДиалога(*строка) for строка in курсор]
+
+    def сводка(self) -> Dict[str, dict]:
+        return {
+            тип: {"count": количество, "unread": непрочитано, "muted": заглушено}
+            for тип, количество, непрочитано, заглушено in self.бд.execute(
+                "SELECT kind, count, unread, muted FROM stats_kind WHERE count > 0"
+            )
+        }
+
+    def гистограмма_активности(self, границы_дней: tuple) -> List[int]:
+        # Возраст последней активности по корзинам границ (в днях); последняя корзина — старше всех границ,
+        # отдельно в конце — диалоги без известной даты
+        сегодня = int(time.time() // 86400)
+        корзины = [0] * (len(границы_дней) + 2)
+        for день, количество in self.бд.execute("SELECT day, SUM(count) FROM stats_day GROUP BY day"):
+            if день <= 0:
+                корзины[-1] += количество
+            else:
+                корзины[bisect.bisect_left(границы_дней, сегодня - день)] += количество
+        return корзины
+
+    def неактивные(self, дней: int, лимит: int = 50, тип: Optional[str] = None) -> List[ЗаписьДиалога]:
+        граница = time.time() - дней * 86400
+        условие, параметры = "date > 0 AND date < ?", [граница]
+        if тип:
+            условие += " AND kind = ?"
+            параметры.append(тип)
+        курсор = self.бд.execute(
+            f"SELECT {self.КОЛОНКИ} FROM dialogs WHERE {условие} ORDER BY date LIMIT ?", (*параметры, лимит)
+        )
+        return [ЗаписьДиалога(*строка) for строка in курсор]
+
+    def количество_неактивных(self, дней: int) -> int:
+        # С точностью до дня, как и гистограмма: возраст больше указанного числа дней
+        граница = int(time.time() // 86400) - дней
+        return self.бд.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM stats_day WHERE day > 0 AND day < ?", (граница,)
+        ).fetchone()[0]
+
+    def количество_по_фильтру(self, фильтр: Фильтр) -> int:
+        return self.бд.execute(f"SELECT COUNT(*) FROM dialogs WHERE {фильтр.условие}", фильтр.параметры).fetchone()[0]
+
+    def записи_по_фильтру(self, фильтр: Фильтр, лимит: int = -1) -> List[ЗаписьДиалога]:
+        курсор = self.бд.execute(
+            f"SELECT {self.КОЛОНКИ} FROM dialogs WHERE {фильтр.условие} ORDER BY date LIMIT ?",
+            (*фильтр.параметры, лимит)
+        )
+        return [ЗаписьДиалога(*строка) for строка in курсор]
+
+    def идентификаторы_по_фильтру(self, фильтр: Фильтр) -> List[int]:
+        return [строка[0] for строка in self.бд.execute(
+            f"SELECT id FROM dialogs WHERE {фильтр.условие} ORDER BY date", фильтр.параметры
+        )]
+
+    def идентификаторы(self, тип: str) -> List[int]:
+        return [строка[0] for строка in self.бд.execute(
+            "SELECT id FROM dialogs WHERE kind = ? ORDER BY date DESC", (тип,)
+        )]
+
+    def удалить(self, id_: int):
+        self.бд.execute("DELETE FROM dialogs WHERE id = ?", (id_,))
+        self._зафиксировать()
+
+    def сохранить(self, запись: ЗаписьДиалога):
+        # Обновляем тип и название, не затирая дату и счётчик непрочитанных уже известного диалога
+        self.бд.execute(
+            f"""INSERT INTO dialogs ({self.КОЛОНКИ}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET kind = excluded.kind, title = excluded.title,
+                   bot = excluded.bot, megagroup = excluded.megagroup,
+                   date = MAX(date, excluded.date)""",
+            запись.как_строка()
+        )
+        self._зафиксировать()
+
+    def отметить_сообщение(self, id_: int, дата: float, входящее: bool) -> bool:
+        курсор = self.бд.execute(
+            "UPDATE dialogs SET date = MAX(date, ?), unread = unread + ? WHERE id = ?",
+            (дата, int(входящее), id_)
+        )
+        self._зафиксировать()
+        return курсор.rowcount > 0
+
+    def отметить_прочитанным(self, id_: int):
+        self.бд.execute("UPDATE dialogs SET unread = 0 WHERE id = ?", (id_,))
+        self._зафиксировать()
+
+    def переименовать(self, id_: int, название: str):
+        self.бд.execute("UPDATE dialogs SET title = ? WHERE id = ?", (название, id_))
+        self._зафиксировать()
+
+    def закрыть(self):
+        self.бд.close()
+
+class ИндексПоиска:
+    # Поиск по названиям и ID для выбора чата: префиксы через bisect, подстроки через триграммы
+    ЛИМИТ = 50
+
+    def __init__(self, записи: Iterable[ЗаписьДиалога]):
+        self.ids = array('q')
+        self.названия: List[str] = []
+        self._строчные: List[str] = []
+        self._триграммы: Dict[str, array] = {}
+        for поз, запись in enumerate(записи):
+            self.ids.append(запись.id)
+            self.названия.append(запись.название)
+            строчное = запись.название.lower()
+            self._строчные.append(строчное)
+            for триграмма in set(self._разбить(строчное)):
+                список = self._триграммы.get(триграмма)
+                if список is None:
+                    список = self._триграммы[триграмма] = array('I')
+                список.append(поз)
+        self._по_названию = sorted(range(len(self._строчные)), key=self._строчные.__getitem__)
+        self._ключи_названий = [self._строчные[поз] for поз in self._по_названию]
+        self._по_id = sorted(range(len(self.ids)), key=lambda поз: str(self.ids[поз]))
+        self._ключи_id = [str(self.ids[поз]) for поз in self._по_id]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _разбить(текст: str) -> Iterator[str]:
+        for i in range(len(текст) - 2):
+            yield текст[i:i + 3]
+
+    @staticmethod
+    def _по_префиксу(ключи: List[str], позиции: List[int], префикс: str, лимит: int) -> List[int]:
+        начало = bisect.bisect_left(ключи, префикс)
+        найдено = []
+        for i in range(начало, min(len(ключи), начало + лимит)):
+            if not ключи[i].startswith(префикс):
+                break
+            найдено.append(позиции[i])
+        return найдено
+
+    def найти(self, запрос: str, лимит: int = ЛИМИТ) -> List[int]:
+        # Возвращает позиции записей в порядке индекса диалогов (сначала недавние)
+        запрос = запрос.strip().lower()
+        if not запрос:
+            return list(range(min(лимит, len(self.ids))))
+
+        найдено = set(self._по_префиксу(self._ключи_id, self._по_id, запрос, лимит))
+        if len(запрос) < 3:
+            найдено.update(self._по_префиксу(self._ключи_названий, self._по_названию, запрос, лимит))
+        else:
+            # Списки позиций отсортированы, поэтому достаточно пройти самый короткий из них
+            # и остановиться на первых `лимит` настоящих совпадениях
+            кандидаты = min(
+                (self._триграммы.get(триграмма, ()) for триграмма in set(self._разбить(запрос))), key=len
+            )
+            совпадений = 0
+            for поз in кандидаты:
+                if запрос in self._строчные[поз]:
+                    найдено.add(поз)
+                    совпадений += 1
+                    if совпадений >= лимит:
+                        break
+        return sorted(найдено)[:лимит]
+
+    def найти_id(self, текст: str) -> Optional[int]:
+        текст = текст.strip()
+        i = bisect.bisect_left(self._ключи_id, текст)
+        if i < len(self._ключи_id) and self._ключи_id[i] == текст:
+            return self.ids[self._по_id[i]]
+        return None
+
+def создать_дополнение_чатов(индекс: ИндексПоиска):
+    from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
+
+    class ДополнениеЧатов(Completer):
+        def get_completions(self, document, complete_event):
+            введено = document.text_before_cursor
+            for поз in индекс.найти(введено):
+                id_ = str(индекс.ids[поз])
+                yield Completion(id_, start_position=-len(введено), display=индекс.названия[поз], display_meta=f"ID: {id_}")
+
+    return ThreadedCompleter(ДополнениеЧатов())
+
+ГРАНИЦЫ_АКТИВНОСТИ_ДНЕЙ = (1, 7, 30, 90, 180, 365)
+
+def собрать_статистику(индекс: ИндексДиалогов, дней: int = 180, лимит: int = 50) -> dict:
+    # Всё берётся из агрегатов индекса и выборки по индексу на date, без обхода всех диалогов
+    подписи = [f"<={граница}d" for граница in ГРАНИЦЫ_АКТИВНОСТИ_ДНЕЙ]
+    подписи += [f">{ГРАНИЦЫ_АКТИВНОСТИ_ДНЕЙ[-1]}d", "unknown"]
+    сводка = индекс.сводка()
+    return {
+        "kinds": {
+            имя: сводка.get(тип, {"count": 0, "unread": 0, "muted": 0}) for имя, тип in КОМАНДНЫЕ_ТИПЫ.items()
+        },
+        "total": {
+            поле: sum(значения[поле] for значения in сводка.values()) for поле in ("count", "unread", "muted")
+        },
+        "activity_age": dict(zip(подписи, индекс.гистограмма_активности(ГРАНИЦЫ_АКТИВНОСТИ_ДНЕЙ))),
+        "inactive": {
+            "days": дней,
+            "count": индекс.количество_неактивных(дней),
+            "top": [
+                {"id": з.id, "kind": ТИПЫ_ДЛЯ_ВЫВОДА[з.тип], "title": з.название, "last_activity": з.дата}
+                for з in индекс.неактивные(дней, лимит)
+            ],
+        },
+    }
+
+ФОРМАТЫ_ЭКСПОРТА = ('jsonl', 'csv', 'parquet')
+ПОЛЯ_ЭКСПОРТА = ('id', 'kind', 'title', 'bot', 'megagroup', 'unread', 'last_activity', 'muted')
+
+def _пакеты(записи: Iterable[ЗаписьДиалога], размер: int) -> Iterator[List[tuple]]:
+    пакет = []
+    for з in записи:
+        пакет.append((
+            з.id, ТИПЫ_ДЛЯ_ВЫВОДА[з.тип], з.название, bool(з.бот), bool(з.мегагруппа),
+            з.непрочитано, з.дата, bool(з.заглушен)
+        ))
+        if len(пакет) >= размер:
+            yield пакет
+            пакет = []
+    if пакет:
+        yield пакет
+
+def экспортировать(записи: Iterable[ЗаписьДиалога], путь: Path, формат: str, размер_пакета: int = 5000) -> int:
+    # Записи читаются и пишутся пакетами, поэтому память не зависит от количества диалогов
+    всего = 0
+    if формат == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Для экспорта в parquet установите pyarrow")
+        схема = pa.schema([
+            ('id', pa.int64()), ('kind', pa.string()), ('title', pa.string()), ('bot', pa.bool_()),
+            ('megagroup', pa.bool_()), ('unread', pa.int32()), ('last_activity', pa.float64()), ('muted', pa.bool_()),
+        ])
+        with pq.ParquetWriter(str(путь), схема, compression='zstd') as писатель:
+            for пакет in _пакеты(записи, размер_пакета):
+                столбцы = list(zip(*пакет))
+                писатель.write_table(pa.Table.from_arrays(
+                    [pa.array(столбец, type=поле.type) for столбец, поле in zip(столбцы, схема)], schema=схема
+                ))
+                всего += len(пакет)
+        return всего
+
+    with путь.open('w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+        if формат == 'csv':
+            писатель = csv.writer(f)
+            писатель.writerow(ПОЛЯ_ЭКСПОРТА)
+            for пакет in _пакеты(записи, размер_пакета):
+                писатель.writerows(пакет)
+                всего += len(пакет)
+        elif формат == 'jsonl':
+            for пакет in _пакеты(записи, размер_пакета):
+                f.write("".join(
+                    json.dumps(dict(zip(ПОЛЯ_ЭКСПОРТА, строка)), ensure_ascii=False) + "\n" for строка in пакет
+                ))
+                всего += len(пакет)
+        else:
+            raise ValueError(f"Неизвестный формат экспорта: {формат}")
+    return всего
+
+class МетрикиRPC:
+    # Счётчики по методам API: число вызовов и ошибок, гистограмма задержек, отправленные байты.
+    # Отдельно считается время, когда хотя бы один запрос в сети, чтобы отделить сеть от локальной работы
+    ГРАНИЦЫ_МС = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.методы: Dict[str, dict] = {}
+        self.действия: Dict[str, dict] = {}
+        self.flood_сообщено = 0.0
+        self.flood_ожидание = 0.0
+        self.начало = time.time()
+        self._в_полёте = 0
+        self._сеть_с = 0.0
+        self._сеть_старт = 0.0
+
+    def _метод(self, имя: str) -> dict:
+        метод = self.методы.get(имя)
+        if метод is None:
+            метод = self.методы[имя] = {
+                "вызовов": 0, "ошибок": 0, "секунд": 0.0, "байт": 0,
+                "гистограмма": [0] * (len(self.ГРАНИЦЫ_МС) + 1),
+            }
+        return метод
+
+    def учесть(self, имя: str, секунд: float, байт: int = 0, ошибка: Optional[Exception] = None):
+        метод = self._метод(имя)
+        метод["вызовов"] += 1
+        метод["секунд"] += секунд
+        метод["байт"] += байт
+        метод["гистограмма"][bisect.bisect_left(self.ГРАНИЦЫ_МС, секунд * 1000)] += 1
+        if ошибка is not None:
+            метод["ошибок"] += 1
+            # FloodWaitError, SlowModeWaitError и прочие ошибки ожидания Telethon несут поле seconds
+            self.flood_сообщено += getattr(ошибка, 'seconds', 0) or 0
+
+    def учесть_ожидание(self, секунд: float):
+        self.flood_ожидание += секунд
+
+    def _начать_запрос(self):
+        if self._в_полёте == 0:
+            self._сеть_старт = time.perf_counter()
+        self._в_полёте += 1
+
+    def _закончить_запрос(self):
+        self._в_полёте -= 1
+        if self._в_полёте == 0:
+            self._сеть_с += time.perf_counter() - self._сеть_старт
+
+    def сеть_с(self) -> float:
+        if self._в_полёте:
+            return self._сеть_с + time.perf_counter() - self._сеть_старт
+        return self._сеть_с
+
+    @contextlib.contextmanager
+    def действие(self, имя: str):
+        старт, сеть = time.perf_counter(), self.сеть_с()
+        try:
+            yield
+        finally:
+            всего = time.perf_counter() - старт
+            в_сети = min(всего, self.сеть_с() - сеть)
+            действие = self.действия.setdefault(имя, {"раз": 0, "всего_с": 0.0, "сеть_с": 0.0, "локально_с": 0.0})
+            действие["раз"] += 1
+            действие["всего_с"] += всего
+            действие["сеть_с"] += в_сети
+            действие["локально_с"] += всего - в_сети
+
+    @contextlib.asynccontextmanager
+    async def замер(self, имя: str, байт: int = 0):
+        старт = time.perf_counter()
+        self._начать_запрос()
+        ошибка = None
+        try:
+            yield
+        except Exception as e:
+            ошибка = e
+            raise
+        finally:
+            self._закончить_запрос()
+            self.учесть(имя, time.perf_counter() - старт, байт, ошибка)
+
+    def обернуть(self, клиент):
+        # Все запросы Telethon (страницы iter_dialogs, delete_dialog и т.д.) проходят через _call,
+        # поэтому достаточно подменить его у экземпляра клиента. Замеряется каждая отправка через sender
+        # отдельно: FloodWait до flood_sleep_threshold Telethon просыпает внутри _call и повторяет запрос,
+        # и это ожидание должно попасть в учёт FloodWait, а не в задержку запроса
+        исходный = getattr(клиент, '_call', None)
+        if исходный is None:
+            return
+
+        async def _call(sender, request, ordered=False, flood_sleep_threshold=None):
+            имя = type(request).__name__
+            try:
+                байт = len(bytes(request))
+            except Exception:
+                байт = 0
+            порог = клиент.flood_sleep_threshold if flood_sleep_threshold is None else flood_sleep_threshold
+            # Запрос, уже получивший FloodWait, Telethon до отправки придерживает сам (меньше 3 с — игнорирует)
+            due = getattr(клиент, '_flood_waited_requests', {}).get(getattr(request, 'CONSTRUCTOR_ID', None))
+            if due is not None and 3 < round(due - time.time()) <= порог:
+                self.учесть_ожидание(round(due - time.time()))
+            return await исходный(
+                _ЗамерОтправки(sender, self, клиент, имя, байт), request,
+                ordered=ordered, flood_sleep_threshold=flood_sleep_threshold
+            )
+
+        клиент._call = _call
+
+    def процентиль(self, доля: float) -> Optional[float]:
+        гистограмма = [sum(столбец) for столбец in zip(*(м["гистограмма"] for м in self.методы.values()))]
+        всего = sum(гистограмма)
+        if not всего:
+            return None
+        накоплено = 0
+        for i, количество in enumerate(гистограмма):
+            накоплено += количество
+            if накоплено >= всего * доля:
+                return self.ГРАНИЦЫ_МС[i] if i < len(self.ГРАНИЦЫ_МС) else float('inf')
+        return None
+
+    def сводка(self) -> str:
+        вызовов = sum(м["вызовов"] for м in self.методы.values())
+        if not вызовов:
+            return "RPC: запросов ещё не было"
+        ошибок = sum(м["ошибок"] for м in self.методы.values())
+        p50, p95 = self.процентиль(0.5), self.процентиль(0.95)
+        локально = sum(д["локально_с"] for д in self.действия.values())
+        return (
+            f"RPC: {вызовов} (ошибок {ошибок}) · p50 ≤{p50} мс · p95 ≤{p95} мс · "
+            f"сеть {self.сеть_с():.1f} с · локально {локально:.1f} с · FloodWait {self.flood_ожидание:.0f} с"
+        )
+
+    def сохранить(self, путь: Path = METRICS_FILE, **метки):
+        if not self.методы and not self.действия:
+            return
+        путь.parent.mkdir(parents=True, exist_ok=True)
+        запись = {
+            "начало": self.начало, "конец": time.time(), **метки,
+            "границы_мс": self.ГРАНИЦЫ_МС, "методы": self.методы, "действия": self.действия,
+            "сеть_с": self.сеть_с(), "flood_сообщено_с": self.flood_сообщено, "flood_ожидание_с": self.flood_ожидание,
+        }
+        with путь.open('a', encoding='utf-8') as f:
+            f.write(json.dumps(запись, ensure_ascii=False) + "\n")
+
+class _ЗамерОтправки:
+    # Обёртка над MTProtoSender на время одного _call: каждая попытка отправки замеряется отдельно
+    def __init__(self, sender, метрики: МетрикиRPC, клиент, имя: str, байт: int):
+        self._sender = sender
+        self._метрики = метрики
+        self._клиент = клиент
+        self._имя = имя
+        self._байт = байт
+
+    def __getattr__(self, имя: str):
+        return getattr(self._sender, имя)
+
+    def send(self, request, ordered=False):
+        ответ = self._sender.send(request, ordered=ordered)
+        if isinstance(ответ, list):
+            return [asyncio.ensure_future(self._дождаться(future)) for future in ответ]
+        return asyncio.ensure_future(self._дождаться(ответ))
+
+    async def _дождаться(self, future):
+        try:
+            async with self._метрики.замер(self._имя, self._байт):
+                return await future
+        except Exception as e:
+            # Ошибки 420 (FloodWait, SlowModeWait и т.п.) короче порога клиент проспит сам и повторит запрос
+            секунды = getattr(e, 'seconds', None)
+            if getattr(e, 'code', None) == 420 and секунды is not None \
+                    and max(секунды, 1) <= self._клиент.flood_sleep_threshold:
+                self._метрики.учесть_ожидание(max(секунды, 1))
+            raise
+
+МЕТРИКИ = МетрикиRPC()
+
+class РегуляторСкорости:
+    # Выполняет операцию над списком целей с адаптивной параллельностью: медленно разгоняется
+    # после серии успехов, а FloodWait от сервера ставит на паузу всех воркеров и режет параллельность вдвое
+
+    def __init__(self, начальная: int = 2, максимум: int = 8, попыток: int = 3,
+                 клиент=None, пауза_повтора: float = 1.0):
+        self.параллельность = начальная
+        self.максимум = максимум
+        self.попыток = попыток
+        self.клиент = клиент
+        self.пауза_повтора = пауза_повтора
+        self.ожидание_flood = 0.0
+        self._пауза_до = 0.0
+        self._активных = 0
+        self._успехов_подряд = 0
+        self._освобождено: Optional[asyncio.Event] = None
+
+    def _притормозить(self, секунды: float) -> float:
+        сейчас = time.monotonic()
+        новое_окно = self._пауза_до <= сейчас
+        новая_пауза = сейчас + секунды
+        добавлено = max(0.0, новая_пауза - max(self._пауза_до, сейчас))
+        self._пауза_до = max(self._пауза_до, новая_пауза)
+        self.ожидание_flood += добавлено
+        МЕТРИКИ.учесть_ожидание(добавлено)
+        # FloodWait от запросов, ушедших до паузы, уже учтён этим окном
+        if новое_окно:
+            self.параллельность = max(1, self.параллельность // 2)
+        self._успехов_подряд = 0
+        return добавлено
+
+    def _разогнать(self):
+        self._успехов_подряд += 1
+        if self._успехов_подряд >= self.параллельность * 4 and self.параллельность < self.максимум:
+            self.параллельность += 1
+            self._успехов_подряд = 0
+
+    async def _войти(self):
+        while True:
+            пауза = self._пауза_до - time.monotonic()
+            if пауза > 0:
+                await asyncio.sleep(пауза)
+                continue
+            if self._активных < self.параллельность:
+                self._активных += 1
+                return
+            self._освобождено.clear()
+            await self._освобождено.wait()
+
+    def _выйти(self):
+        self._активных -= 1
+        self._освобождено.set()
+
+    async def выполнить(self, цели: List[int], операция: Callable[[int], Awaitable],
+                        при_результате: Optional[Callable[[int, Optional[Exception]], None]] = None,
+                        при_ожидании: Optional[Callable[[float], None]] = None) -> tuple:
+        загрузить_telethon()
+        временные_ошибки = (ServerError, TimeoutError, ConnectionError)
+        self._освобождено = asyncio.Event()
+        очередь: asyncio.Queue = asyncio.Queue()
+        for цель in цели:
+            очередь.put_nowait(цель)
+        попытки: Dict[int, int] = {}
+        итог = {'успешных': 0, 'ошибок': 0}
+
+        def завершить(цель: int, ошибка: Optional[Exception]):
+            итог['ошибок' if ошибка else 'успешных'] += 1
+            if при_результате:
+                при_результате(цель, ошибка)
+
+        async def воркер():
+            while not очередь.empty():
+                цель = очередь.get_nowait()
+                повтор_через = None
+                await self._войти()
+                try:
+                    await операция(цель)
+                except (FloodWaitError, SlowModeWaitError) as e:
+                    # Ограничение не считается попыткой: цель вернётся в очередь после общей паузы
+                    добавлено = self._притормозить(e.seconds)
+                    if добавлено and при_ожидании:
+                        при_ожидании(e.seconds)
+                    очередь.put_nowait(цель)
+                except временные_ошибки as e:
+                    попытки[цель] = попытки.get(цель, 0) + 1
+                    if попытки[цель] < self.попыток:
+                        повтор_через = self.пауза_повтора * 2 ** (попытки[цель] - 1)
+                    else:
+                        завершить(цель, e)
+                except Exception as e:
+                    завершить(цель, e)
+                else:
+                    self._разогнать()
+                    завершить(цель, None)
+                finally:
+                    self._выйти()
+                if повтор_через is not None:
+                    # Telethon уже повторял запрос сам, поэтому перед нашей попыткой даём серверу передышку,
+                    # не занимая место среди активных
+                    await asyncio.sleep(повтор_через)
+                    очередь.put_nowait(цель)
+
+        # Telethon сам спит на FloodWait короче flood_sleep_threshold внутри одного запроса, и остальные
+        # воркеры об этом не узнают; на время выполнения все ожидания отдаются регулятору
+        порог = None
+        if self.клиент is not None:
+            порог, self.клиент.flood_sleep_threshold = self.клиент.flood_sleep_threshold, 0
+        try:
+            await asyncio.gather(*(воркер() for _ in range(min(self.максимум, len(цели)))))
+        finally:
+            if self.клиент is not None:
+                self.клиент.flood_sleep_threshold = порог
+        return итог['успешных'], итог['ошибок']
+
+class ЖурналОчистки:
+    # Журнал пакетного выхода/удаления в формате JSONL: одна строка на задание и по строке на каждую цель.
+    # Файл только дописывается и синхронизируется на диск, поэтому после падения задание можно продолжить
+    def __init__(self, путь: Path, действие: str, цели: List[int], создан: float, архив: bool = False):
+        self.путь = путь
+        self.действие = действие
+        self.цели = цели
+        self.создан = создан
+        self.архив = архив
+        self.статусы: Dict[int, str] = {}
+        self.ошибки: Dict[int, str] = {}
+        self.завершён = False
+        self._файл = None
+
+    @classmethod
+    def создать(cls, имя_сессии: str, действие: str, цели: List[int], архив: bool = False) -> 'ЖурналОчистки':
+        JOURNALS_DIR.mkdir(parents=True, exist_ok=True)
+        создан = time.time()
+        путь = JOURNALS_DIR / f"{имя_сессии}_{int(создан * 1000)}.jsonl"
+        журнал = cls(путь, действие, list(цели), создан, архив)
+        журнал._дописать({
+            "тип": "задание", "действие": действие, "цели": журнал.цели, "время": создан, "архив": архив
+        })
+        return журнал
+
+    @classmethod
+    def загрузить(cls, путь: Path) -> Optional['ЖурналОчистки']:
+        журнал = None
+        with путь.open('r', encoding='utf-8') as f:
+            for строка in f:
+                try:
+                    запись = json.loads(строка)
+                except json.JSONDecodeError:
+                    # Последняя строка могла оборваться при аварийном завершении
+                    continue
+                if запись.get("тип") == "задание":
+                    журнал = cls(путь, запись["действие"], запись["цели"], запись["время"], запись.get("архив", False))
+                elif журнал is None:
+                    continue
+                elif запись.get("тип") == "цель":
+                    журнал.статусы[запись["id"]] = запись["статус"]
+                    if запись.get("ошибка"):
+                        журнал.ошибки[запись["id"]] = запись["ошибка"]
+                    else:
+                        журнал.ошибки.pop(запись["id"], None)
+                elif запись.get("тип") == "конец":
+                    журнал.завершён = True
+        return журнал
+
+    @classmethod
+    def незавершённые(cls, имя_сессии: str) -> List['ЖурналОчистки']:
+        if not JOURNALS_DIR.exists():
+            return []
+        журналы = []
+        for путь in sorted(JOURNALS_DIR.glob(f"{имя_сессии}_*.jsonl")):
+            журнал = cls.загрузить(путь)
+            if журнал and not журнал.завершён:
+                журналы.append(журнал)
+            elif журнал:
+                # Завершённые журналы из версий, которые ещё не переносили их в done/
+                журнал._в_архив()
+        return журналы
+
+    def _дописать(self, запись: dict):
+        if self._файл is None:
+            self._файл = self.путь.open('a', encoding='utf-8')
+            # Оборванную при падении строку закрываем, чтобы новая запись не склеилась с ней
+            if self._файл.tell() > 0:
+                with self.путь.open('rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._файл.write("\n")
+        self._файл.write(json.dumps(запись, ensure_ascii=False) + "\n")
+        self._файл.flush()
+        os.fsync(self._файл.fileno())
+
+    def записать(self, id_: int, ошибка: Optional[Exception] = None):
+        статус = "ошибка" if ошибка else "готово"
+        self.статусы[id_] = статус
+        запись = {"тип": "цель", "id": id_, "статус": статус}
+        if ошибка:
+            self.ошибки[id_] = запись["ошибка"] = f"{type(ошибка).__name__}: {ошибка}"
+        self._дописать(запись)
+
+    def завершить(self, отменён: bool = False):
+        self.завершён = True
+        self._дописать({"тип": "конец", "время": time.time(), "отменён": отменён})
+        self.закрыть()
+        self._в_архив()
+
+    def _в_архив(self):
+        # Завершённые журналы уходят в done/, чтобы при выборе аккаунта читались только незавершённые
+        каталог = self.путь.parent / 'done'
+        каталог.mkdir(exist_ok=True)
+        путь_ошибок = self.путь.with_suffix('.errors.log')
+        self.путь = self.путь.replace(каталог / self.путь.name)
+        if путь_ошибок.exists():
+            путь_ошибок.replace(каталог / путь_ошибок.name)
+
+    def закрыть(self):
+        if self._файл is not None:
+            self._файл.close()
+            self._файл = None
+
+    def оставшиеся(self) -> List[int]:
+        return [цель for цель in self.цели if цель not in self.статусы]
+
+    def отчёт(self) -> dict:
+        готово = sum(1 for статус in self.статусы.values() if статус == "готово")
+        return {
+            "всего": len(self.цели),
+            "готово": готово,
+            "ошибок": len(self.статусы) - готово,
+            "осталось": len(self.оставшиеся()),
+            "ошибки": self.ошибки,
+        }
+
+class АрхивЧатов:
+    # История чата перед удалением: страницы get_messages от старых к новым дописываются в <id>.jsonl.gz,
+    # каждая страница — отдельный gzip-член. В <id>.state хранятся последний сохранённый id и размер файла,
+    # поэтому в памяти только одна страница, а прерванный чат продолжается с того же сообщения
+    РАЗМЕР_СТРАНИЦЫ = 100
+
+    def __init__(self, имя_сессии: str, размер_страницы: int = РАЗМЕР_СТРАНИЦЫ):
+        self.каталог = ARCHIVE_DIR / имя_сессии
+        self.размер_страницы = размер_страницы
+        self.сообщений = 0
+
+    def путь(self, id_: int) -> Path:
+        return self.каталог / f"{id_}.jsonl.gz"
+
+    def _состояние(self, id_: int) -> dict:
+        try:
+            return json.loads((self.каталог / f"{id_}.state").read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {"last_id": 0, "size": 0, "done": False}
+
+    def _сохранить_состояние(self, id_: int, состояние: dict):
+        путь = self.каталог / f"{id_}.state"
+        временный = путь.with_suffix('.tmp')
+        временный.write_text(json.dumps(состояние), encoding='utf-8')
+        os.replace(временный, путь)
+
+    @staticmethod
+    def _сообщение(сообщение) -> dict:
+        return {
+            "id": сообщение.id,
+            "date": сообщение.date.timestamp() if сообщение.date else None,
+            "sender_id": сообщение.sender_id,
+            "reply_to": сообщение.reply_to_msg_id,
+            "text": сообщение.message,
+            "media": type(сообщение.media).__name__ if сообщение.media else None,
+        }
+
+    async def сохранить(self, клиент, id_: int) -> int:
+        состояние = self._состояние(id_)
+        # Чат мог вернуться и пополниться после прошлого удаления: дописываем всё после last_id
+        состояние["done"] = False
+        self.каталог.mkdir(parents=True, exist_ok=True)
+        сохранено = 0
+        with self.путь(id_).open('ab') as файл:
+            # Отбрасываем хвост страницы, которая не успела попасть в состояние до прерывания
+            файл.truncate(состояние["size"])
+            while not состояние["done"]:
+                пакет = await клиент.get_messages(
+                    id_, limit=self.размер_страницы, offset_id=состояние["last_id"], reverse=True
+                )
+                if пакет:
+                    with gzip.GzipFile(filename='', mode='wb', fileobj=файл) as член:
+                        for сообщение in пакет:
+                            член.write((json.dumps(self._сообщение(сообщение), ensure_ascii=False) + "\n").encode('utf-8'))
+                    файл.flush()
+                    os.fsync(файл.fileno())
+                    состояние["last_id"] = пакет[-1].id
+                    состояние["size"] = файл.tell()
+                    сохранено += len(пакет)
+                    self.сообщений += len(пакет)
+                состояние["done"] = len(пакет) < self.размер_страницы
+                self._сохранить_состояние(id_, состояние)
+        return сохранено
+
+def создать_операцию_очистки(клиент, архив: Optional[АрхивЧатов] = None) -> Callable[[int], Awaitable]:
+    if архив is None:
+        return клиент.delete_dialog
+
+    # Архив и удаление — одна операция для регулятора: FloodWait на любой странице
+    # возвращает чат в очередь, и повтор продолжает архив с сохранённого сообщения
+    async def архивировать_и_удалить(цель: int):
+        await архив.сохранить(клиент, цель)
+        await клиент.delete_dialog(цель)
+    return архивировать_и_удалить
+
 def создать_3d_баннер():
     ширина = CONSOLE.width
     текст = "TELEGA"
@@ -187,12 +1422,106 @@ def создать_3d_баннер():
 """
     return баннер.strip()
 
+class ПанельОчистки:
+    # Одна живая панель на всю массовую операцию вместо строки на каждую цель: обработчики результатов
+    # только меняют счётчики, а Live перерисовывает сводку не чаще ЧАСТОТА раз в секунду.
+    # Полный список ошибок дописывается в файл рядом с журналом
+    ЧАСТОТА = 4
+    ПОСЛЕДНИХ_ОШИБОК = 5
+    ШИРИНА_ПОЛОСЫ = 40
+
+    def __init__(self, заголовок: str, всего: int, путь_ошибок: Path, регулятор: Optional[РегуляторСкорости] = None):
+        self.заголовок = заголовок
+        self.всего = всего
+        self.путь_ошибок = путь_ошибок
+        self.регулятор = регулятор
+        self.готово = 0
+        self.ошибок = 0
+        self._последние = deque(maxlen=self.ПОСЛЕДНИХ_ОШИБОК)
+        self._пауза_до = 0.0
+        self._старт = time.monotonic()
+        self._файл = None
+        self._live = None
+
+    def __enter__(self) -> 'ПанельОчистки':
+        self._старт = time.monotonic()
+        self._live = Live(console=CONSOLE, refresh_per_second=self.ЧАСТОТА, get_renderable=self._отрисовать)
+        self._live.start(refresh=True)
+        return self
+
+    def __exit__(self, *_):
+        self._live.stop()
+        if self._файл is not None:
+            self._файл.close()
+            self._файл = None
+
+    def успех(self):
+        self.готово += 1
+
+    def ошибка(self, цель: int, ошибка: Exception):
+        self.ошибок += 1
+        строка = f"{цель}: {type(ошибка).__name__}: {ошибка}"
+        self._последние.append(строка)
+        if self._файл is None:
+            self._файл = self.путь_ошибок.open('a', encoding='utf-8')
+        self._файл.write(f"{datetime.now():%Y-%m-%d %H:%M:%S}\t{строка}\n")
+        self._файл.flush()
+
+    def пауза(self, секунды: float):
+        self._пауза_до = max(self._пауза_до, time.monotonic() + секунды)
+
+    @staticmethod
+    def _время(секунды: float) -> str:
+        секунды = int(секунды)
+        return f"{секунды // 3600}:{секунды // 60 % 60:02d}:{секунды % 60:02d}"
+
+    def _отрисовать(self):
+        сейчас = time.monotonic()
+        прошло = сейчас - self._старт
+        обработано = self.готово + self.ошибок
+        скорость = обработано / прошло if прошло > 0 else 0.0
+        доля = обработано / self.всего if self.всего else 1.0
+        заполнено = int(доля * self.ШИРИНА_ПОЛОСЫ)
+
+        текст = RichText()
+        текст.append("█" * заполнено, style="#29b6f6")
+        текст.append("░" * (self.ШИРИНА_ПОЛОСЫ - заполнено), style="dim")
+        текст.append(f" {доля * 100:5.1f}%  {обработано}/{self.всего}\n")
+        текст.append(f"Успешно: {self.готово}   ")
+        текст.append(f"Ошибок: {self.ошибок}\n", style="bold red" if self.ошибок else "")
+        осталось = self._время((self.всего - обработано) / скорость) if скорость else "—"
+        текст.append(f"Скорость: {скорость:.1f}/сек   Прошло: {self._время(прошло)}   Осталось: ~{осталось}")
+        if self.регулятор:
+            текст.append(f"   Параллельно: {self.регулятор.параллельность}")
+        if self._пауза_до > сейчас:
+            текст.append(f"\nFloodWait: все запросы на паузе ещё {self._пауза_до - сейчас:.0f} сек", style="yellow")
+        if self._последние:
+            текст.append("\nПоследние ошибки:", style="bold red")
+            for строка in self._последние:
+                текст.append(f"\n  {строка[:CONSOLE.width - 10]}", style="red")
+            текст.append(f"\nВсе ошибки: {self.путь_ошибок}", style="dim")
+        return Panel(текст, title=self.заголовок, border_style="yellow" if self.ошибок else "#0288d1")
+
 class ПриложениеТелеграм:
-    def __init__(self, аккаунт: Аккаунт):
+    # Сколько секунд после выхода при очистке не запрашивать канал по пришедшему UpdateChannel
+    ОКНО_ОЧИСТКИ = 120
+
+    def __init__(self, аккаунт: Аккаунт, живой_индекс: bool = True):
         self.аккаунт = аккаунт
+        загрузить_telethon()
+        SESSIONS_DIR.mkdir(exist_ok=True)
         путь_сессии = SESSIONS_DIR / аккаунт.имя_сессии
         self.клиент = TelegramClient(str(путь_сессии), аккаунт.api_id, аккаунт.api_hash)
+        МЕТРИКИ.обернуть(self.клиент)
+        self.индекс = ИндексДиалогов(SESSIONS_DIR / f"{аккаунт.имя_сессии}.dialogs.db")
+        self._индекс_актуален = False
+        self.живой_индекс = живой_индекс
+        self._подписка_активна = False
+        self._поиск: Dict[str, tuple] = {}
+        self._фоновое_обновление: Optional[asyncio.Task] = None
+        self._удалены_очисткой: Dict[int, float] = {}
         self.я = None
+        self.предупреждение: Optional[str] = None
         self.текущее_действие = "Ожидание"
         self.контроллер_спама = КонтроллерСпама()
 
@@ -208,10 +1537,14 @@ class ПриложениеТелеграм:
             строки.append(f"📱 Аккаунт: [cyan]{self.аккаунт.телефон}[/cyan]")
 
         строки.append(f"⚙️ Действие: [bold #29b6f6]{self.текущее_действие}[/bold #29b6f6]")
+        if self.предупреждение:
+            строки.append(f"{EMOJI['внимание']} [yellow]{self.предупреждение}[/yellow]")
 
         if self.контроллер_спама.запущен:
             строки.append(f"{EMOJI['спам']} [bold red]СПАМ АКТИВЕН[/bold red] | Отправлено: {self.контроллер_спама.отправлено}")
 
+        строки.append(f"📊 [dim]{МЕТРИКИ.сводка()}[/dim]")
+
         CONSOLE.print(Panel("\n".join(строки), style="bold #0288d1", padding=(1, 2), expand=False))
 
     async def подключиться(self) -> bool:
@@ -219,7 +1552,8 @@ class ПриложениеТелеграм:
         self._вывести_заголовок()
 
         try:
-            await self.клиент.connect()
+            async with МЕТРИКИ.замер('connect'):
+                await self.клиент.connect()
             if not await self.клиент.is_user_authorized():
                 CONSOLE.print(f"\n{EMOJI['авторизация']} Требуется авторизация для {self.аккаунт.телефон}")
                 await self.клиент.send_code_request(self.аккаунт.телефон)
@@ -236,6 +1570,9 @@ class ПриложениеТелеграм:
                         return False
 
             self.я = await self.клиент.get_me()
+            self.предупреждение = None
+            if self.живой_индекс:
+                self._подписаться_на_обновления()
             return True
 
         except (ApiIdInvalidError, PhoneNumberInvalidError) as e:
@@ -244,7 +1581,37 @@ class ПриложениеТелеграм:
             CONSOLE.print(Panel(f"{EMOJI['ошибка']} [bold red]Ошибка подключения: {e}[/bold red]", border_style="red"))
         return False
 
+    async def прогреть(self) -> bool:
+        # Тихое подключение для пула: без вывода и запроса кода, только для уже авторизованной сессии
+        await self.клиент.connect()
+        if not await self.клиент.is_user_authorized():
+            return False
+        self.я = await self.клиент.get_me()
+        if self.живой_индекс:
+            self._подписаться_на_обновления()
+        # Аккаунт уже можно выбирать; индекс (при первом запуске — полный обход диалогов) догружается
+        # отдельно, и действия, которым он нужен, дождутся этой задачи
+        self._фоновое_обновление = asyncio.create_task(self._обновить_индекс_тихо())
+        return True
+
+    async def _обновить_индекс_тихо(self):
+        # Ошибки не печатаются поверх меню другого аккаунта, а показываются в заголовке этого
+        try:
+            with МЕТРИКИ.действие('обновление_индекса'):
+                await self.индекс.обновить(self.клиент)
+            self._индекс_актуален = True
+        except Exception as e:
+            self.предупреждение = f"Фоновое обновление индекса не удалось: {e}"
+
+    async def закрыть(self):
+        if self._фоновое_обновление is not None and not self._фоновое_обновление.done():
+            self._фоновое_обновление.cancel()
+            await asyncio.wait([self._фоновое_обновление])
+        await self.клиент.disconnect()
+        self.индекс.закрыть()
+
     async def запустить(self):
+        await self._предложить_возобновление()
         while True:
             self.текущее_действие = "Главное меню"
             self._вывести_заголовок()
@@ -255,6 +1622,9 @@ class ПриложениеТелеграм:
                 f"{EMOJI['группа']} Список групп",
                 f"{EMOJI['пользователь']} Список личных чатов",
                 f"{EMOJI['бот']} Список ботов",
+                f"{EMOJI['информация']} Полная синхронизация диалогов",
+                f"{EMOJI['информация']} Экспорт диалогов",
+                f"{EMOJI['информация']} Статистика аккаунта",
 
                 Separator(f" {EMOJI['рассылка']} Рассылка "),
                 f"{EMOJI['рассылка']} Рассылка в личные чаты",
@@ -269,6 +1639,7 @@ class ПриложениеТелеграм:
                 f"{EMOJI['выход']} Покинуть все группы",
                 f"{EMOJI['удалить']} Удалить личные чаты",
                 f"{EMOJI['удалить']} Удалить ботов",
+                f"{EMOJI['удалить']} Очистка по фильтру",
 
                 Separator(f" {EMOJI['пользователь']} Аккаунт "),
                 f"{EMOJI['назад']} Сменить аккаунт",
@@ -289,6 +1660,9 @@ class ПриложениеТелеграм:
             "Список групп": ("показать_диалоги", "группы"),
             "Список личных чатов": ("показать_диалоги", "личные"),
             "Список ботов": ("показать_диалоги", "боты"),
+            "Полная синхронизация диалогов": ("синхронизировать_диалоги", None),
+            "Экспорт диалогов": ("экспортировать_диалоги", None),
+            "Статистика аккаунта": ("показать_статистику", None),
             "Рассылка в личные чаты": ("выполнить_массовое_действие", "рассылка_личные"),
             "Рассылка в группы": ("выполнить_массовое_действие", "рассылка_группы"),
             "Начать спам": ("начать_спам", None),
@@ -297,6 +1671,7 @@ class ПриложениеТелеграм:
             "Покинуть все группы": ("выполнить_массовое_действие", "покинуть_группы"),
             "Удалить личные чаты": ("выполнить_массовое_действие", "удалить_личные"),
             "Удалить ботов": ("выполнить_массовое_действие", "удалить_ботов"),
+            "Очистка по фильтру": ("очистить_по_фильтру", None),
         }
 
         чистый_выбор = re.sub(r'^[^\s]+\s*', '', выбор)
@@ -305,6 +1680,10 @@ class ПриложениеТелеграм:
             метод = getattr(self, имя_метода)
             self.текущее_действие = чистый_выбор
             self._вывести_заголовок()
+            # Индекс обновляется не больше одного раза за действие, а при живой подписке
+            # достаточно одной синхронизации за сессию
+            if not self._подписка_активна:
+                self._индекс_актуален = False
             if арг:
                 await метод(арг)
             else:
@@ -320,29 +1699,227 @@ class ПриложениеТелеграм:
             'боты': f"{EMOJI['бот']} Боты"
         }
 
-        диалоги = []
-        async for диалог in self.клиент.iter_dialogs():
-            сущность = диалог.entity
-            if тип == 'каналы' and isinstance(сущность, Channel) and not сущность.megagroup:
-                диалоги.append((сущность.title or "Без названия", str(сущность.id)))
-            elif тип == 'группы' and (isinstance(сущность, Chat) or (isinstance(сущность, Channel) and сущность.megagroup)):
-                диалоги.append((сущность.title or "Без названия", str(сущность.id)))
-            elif тип == 'личные' and isinstance(сущность, User) and not сущность.bot and not сущность.is_self:
-                имя = f"{сущность.first_name or ''} {сущность.last_name or ''}".strip() or "Без имени"
-                диалоги.append((имя, str(сущность.id)))
-            elif тип == 'боты' and isinstance(сущность, User) and сущность.bot:
-                диалоги.append((сущность.first_name or "Бот", str(сущность.id)))
-
-        if диалоги:
-            таблица = Table(title=названия[тип], box=box.ROUNDED, header_style="bold #29b6f6")
-            таблица.add_column("#", style="dim", width=4)
-            таблица.add_column("Название", min_width=20, max_width=CONSOLE.width - 30)
+        # Обновление индекса идёт в фоне: первая страница показывается после первого пакета,
+        # остальные читаются из индекса по мере листания
+        # После выхода из просмотра обновление дорабатывает в фоне, а следующие действия его дожидаются
+        обновление = self._фоновое_обновление
+        if обновление is None or обновление.done():
+            первый_пакет = asyncio.Event()
+            обновление = asyncio.create_task(self._обновить_индекс(при_пакете=первый_пакет.set))
+            self._фоновое_обновление = обновление
+            ожидание_пакета = asyncio.create_task(первый_пакет.wait())
+            await asyncio.wait([обновление, ожидание_пакета], return_when=asyncio.FIRST_COMPLETED)
+            ожидание_пакета.cancel()
+
+        await self._листать(тип, названия[тип], обновление)
+
+    async def _листать(self, тип: str, заголовок: str, обновление: asyncio.Task):
+        размер = max(5, CONSOLE.height - 16)
+        сортировки = {'дата': "последней активности", 'название': "названию", 'id': "ID"}
+        сортировка = 'дата'
+        номер = 0
+
+        while True:
+            всего = self.индекс.количество(тип)
+            if not всего and обновление.done():
+                CONSOLE.print(Panel(f"{EMOJI['внимание']} Нет данных для отображения.", border_style="yellow"))
+                return
+            страниц = max(1, math.ceil(всего / размер))
+            номер = min(номер, страниц - 1)
+            записи = self.индекс.страница(тип, сортировка, номер * размер, размер)
+
+            подпись = f"Страница {номер + 1}/{страниц} · всего {всего} · сортировка по {сортировки[сортировка]}"
+            if not обновление.done():
+                подпись += " · загрузка..."
+            таблица = Table(title=заголовок, caption=подпись, box=box.ROUNDED, header_style="bold #29b6f6")
+            таблица.add_column("#", style="dim", width=6)
+            таблица.add_column("Название", min_width=20, max_width=CONSOLE.width - 45)
             таблица.add_column("ID", justify="right")
-            for i, (название, id_) in enumerate(диалоги, 1):
-                таблица.add_row(str(i), название, id_)
+            таблица.add_column("Активность", justify="right")
+            for i, запись in enumerate(записи, номер * размер + 1):
+                активность = datetime.fromtimestamp(запись.дата).strftime('%Y-%m-%d') if запись.дата else "—"
+                таблица.add_row(str(i), запись.название, str(запись.id), активность)
+            self._вывести_заголовок()
             CONSOLE.print(таблица)
+
+            варианты = []
+            if номер + 1 < страниц:
+                варианты.append({"name": "Следующая страница", "value": "вперёд"})
+            if номер > 0:
+                варианты.append({"name": "Предыдущая страница", "value": "назад"})
+            if not обновление.done():
+                варианты.append({"name": "Обновить (идёт загрузка)", "value": "обновить"})
+            варианты += [
+                {"name": f"Сортировать по {название}", "value": ключ}
+                for ключ, название in сортировки.items() if ключ != сортировка
+            ]
+            варианты.append({"name": f"{EMOJI['назад']} Назад", "value": None})
+
+            действие = await questionary.select("Навигация:", choices=варианты, style=CUSTOM_STYLE).ask_async()
+            if действие is None:
+                return
+            elif действие == "вперёд":
+                номер += 1
+            elif действие == "назад":
+                номер -= 1
+            elif действие in сортировки:
+                сортировка = действие
+                номер = 0
+
+    async def _дождаться_фонового_обновления(self):
+        фоновое = self._фоновое_обновление
+        if фоновое is not None and not фоновое.done() and фоновое is not asyncio.current_task():
+            with CONSOLE.status("Загрузка диалогов..."):
+                await asyncio.wait([фоновое])
+
+    async def _обновить_индекс(self, полностью: bool = False, при_пакете: Optional[Callable[[], None]] = None):
+        await self._дождаться_фонового_обновления()
+        if self._индекс_актуален and not полностью:
+            return
+        try:
+            with МЕТРИКИ.действие('обновление_индекса'):
+                await self.индекс.обновить(self.клиент, полностью=полностью, при_пакете=при_пакете)
+            self._индекс_актуален = True
+            self.предупреждение = None
+        except Exception as e:
+            CONSOLE.print(f"{EMOJI['внимание']} Не удалось обновить индекс диалогов: {e}")
+
+    def _подписаться_на_обновления(self):
+        if self._подписка_активна:
+            return
+        self.клиент.add_event_handler(self._при_сообщении, events.NewMessage())
+        self.клиент.add_event_handler(self._при_действии_в_чате, events.ChatAction())
+        self.клиент.add_event_handler(self._при_прочтении, events.MessageRead(inbox=True))
+        self.клиент.add_event_handler(self._при_изменении_канала, events.Raw(types=UpdateChannel))
+        self._подписка_активна = True
+
+    def _добавить_в_индекс(self, id_: int, сущность, дата: float = 0.0, непрочитано: int = 0):
+        класс = классифицировать(сущность)
+        if not класс:
+            return
+        тип, название = класс
+        self.индекс.сохранить(ЗаписьДиалога(
+            id_, тип, название,
+            бот=bool(getattr(сущность, 'bot', False)),
+            мегагруппа=bool(getattr(сущность, 'megagroup', False)),
+            непрочитано=непрочитано, дата=дата
+        ))
+
+    async def _при_сообщении(self, событие):
+        дата = событие.message.date.timestamp() if событие.message.date else time.time()
+        if not self.индекс.отметить_сообщение(событие.chat_id, дата, входящее=not событие.out):
+            сущность = await событие.get_chat()
+            if сущность:
+                self._добавить_в_индекс(событие.chat_id, сущность, дата, непрочитано=int(not событие.out))
+
+    async def _при_действии_в_чате(self, событие):
+        касается_меня = self.я is not None and self.я.id in (событие.user_ids or [])
+        if касается_меня and (событие.user_left or событие.user_kicked):
+            self.индекс.удалить(событие.chat_id)
+        elif касается_меня and (событие.user_joined or событие.user_added):
+            сущность = await событие.get_chat()
+            if сущность:
+                self._добавить_в_индекс(событие.chat_id, сущность, time.time())
+        elif событие.new_title:
+            self.индекс.переименовать(событие.chat_id, событие.new_title)
+
+    async def _при_прочтении(self, событие):
+        self.индекс.отметить_прочитанным(событие.chat_id)
+
+    async def _при_изменении_канала(self, обновление):
+        # UpdateChannel приходит при выходе из канала, смене названия и т.п. без сообщения в чате
+        id_ = utils.get_peer_id(PeerChannel(обновление.channel_id))
+        # Наш собственный выход при очистке тоже присылает UpdateChannel: лишний GetChannels на каждую
+        # цель расходовал бы тот же лимит запросов. Остальные каналы, в том числе только что вступленные
+        # с другого устройства, запрашиваем как раньше
+        if time.monotonic() - self._удалены_очисткой.get(id_, float('-inf')) < self.ОКНО_ОЧИСТКИ:
+            return
+        try:
+            сущность = await self.клиент.get_entity(PeerChannel(обновление.channel_id))
+        except ChannelPrivateError:
+            self.индекс.удалить(id_)
+            return
+        if getattr(сущность, 'left', False):
+            self.индекс.удалить(id_)
         else:
-            CONSOLE.print(Panel(f"{EMOJI['внимание']} Нет данных для отображения.", border_style="yellow"))
+            self._добавить_в_индекс(id_, сущность)
+
+    async def синхронизировать_диалоги(self):
+        await self._дождаться_фонового_обновления()
+        with CONSOLE.status("Синхронизация диалогов..."):
+            await self._обновить_индекс(полностью=True)
+        CONSOLE.print(Panel(f"{EMOJI['успех']} Индекс диалогов синхронизирован.", border_style="green"))
+
+    async def показать_статистику(self):
+        дней_str = await questionary.text("Считать неактивными чаты без активности дольше (дней):", default="180", style=CUSTOM_STYLE).ask_async()
+        try:
+            дней = int(дней_str)
+        except (TypeError, ValueError):
+            CONSOLE.print(Panel(f"{EMOJI['ошибка']} Нужно целое число дней.", border_style="red"))
+            return
+
+        await self._обновить_индекс()
+        статистика = собрать_статистику(self.индекс, дней)
+        названия = {'channels': "Каналы", 'groups': "Группы", 'private': "Личные чаты", 'bots': "Боты"}
+
+        таблица = Table(title="Диалоги", box=box.ROUNDED, header_style="bold #29b6f6")
+        таблица.add_column("Тип")
+        таблица.add_column("Всего", justify="right")
+        таблица.add_column("Непрочитанных", justify="right")
+        таблица.add_column("Без звука", justify="right")
+        for имя, значения in статистика["kinds"].items():
+            таблица.add_row(названия[имя], str(значения["count"]), str(значения["unread"]), str(значения["muted"]))
+        итог = статистика["total"]
+        таблица.add_row("[bold]Итого[/bold]", str(итог["count"]), str(итог["unread"]), str(итог["muted"]))
+        CONSOLE.print(таблица)
+
+        гистограмма = Table(title="Последняя активность", box=box.ROUNDED, header_style="bold #29b6f6")
+        гистограмма.add_column("Давность")
+        гистограмма.add_column("Диалогов", justify="right")
+        гистограмма.add_column("")
+        максимум = max(статистика["activity_age"].values()) or 1
+        for подпись, количество in статистика["activity_age"].items():
+            гистограмма.add_row(подпись, str(количество), "█" * round(30 * количество / максимум))
+        CONSOLE.print(гистограмма)
+
+        неактивные = статистика["inactive"]
+        if неактивные["top"]:
+            список = Table(
+                title=f"Неактивны дольше {дней} дн.: {неактивные['count']}",
+                caption=f"Показаны {len(неактивные['top'])} самых давних" if неактивные["count"] > len(неактивные["top"]) else None,
+                box=box.ROUNDED, header_style="bold #29b6f6"
+            )
+            список.add_column("#", style="dim", width=4)
+            список.add_column("Название", max_width=CONSOLE.width - 45)
+            список.add_column("Тип")
+            список.add_column("Активность", justify="right")
+            for i, запись in enumerate(неактивные["top"], 1):
+                список.add_row(
+                    str(i), запись["title"], названия[запись["kind"]],
+                    datetime.fromtimestamp(запись["last_activity"]).strftime('%Y-%m-%d')
+                )
+            CONSOLE.print(список)
+        else:
+            CONSOLE.print(Panel(f"{EMOJI['успех']} Нет чатов без активности дольше {дней} дн.", border_style="green"))
+
+    async def экспортировать_диалоги(self):
+        формат = await questionary.select("Формат:", choices=list(ФОРМАТЫ_ЭКСПОРТА) + ["Отмена"], style=CUSTOM_STYLE).ask_async()
+        if формат in (None, "Отмена"):
+            return
+        имя = await questionary.text(
+            "Файл:", default=f"{self.аккаунт.имя_сессии}_dialogs.{формат}", style=CUSTOM_STYLE
+        ).ask_async()
+        if not имя:
+            return
+
+        await self._обновить_индекс()
+        try:
+            with CONSOLE.status("Экспорт диалогов..."), МЕТРИКИ.действие('экспорт'):
+                всего = экспортировать(self.индекс.записи(), Path(имя), формат)
+        except (RuntimeError, OSError) as e:
+            CONSOLE.print(Panel(f"{EMOJI['ошибка']} Экспорт не удался: {e}", border_style="red"))
+            return
+        CONSOLE.print(Panel(f"{EMOJI['успех']} Экспортировано диалогов: {всего} → {имя}", border_style="green"))
 
     async def начать_спам(self):
         if self.контроллер_спама.запущен:
@@ -406,30 +1983,40 @@ class ПриложениеТелеграм:
 
         карта_типов = {"Из каналов": "каналы", "Из групп": "группы", "Из ботов": "боты", "Из личных чатов": "личные"}
         тип = карта_типов[метод]
-        диалоги = []
-
-        async for диалог in self.клиент.iter_dialogs():
-            сущность = диалог.entity
-            условия = {
-                "каналы": isinstance(сущность, Channel) and not сущность.megagroup,
-                "группы": isinstance(сущность, Chat) or (isinstance(сущность, Channel) and сущность.megagroup),
-                "боты": isinstance(сущность, User) and сущность.bot,
-                "личные": isinstance(сущность, User) and not сущность.bot and not сущность.is_self
-            }
-            if условия[тип]:
-                название = getattr(сущность, 'title', None) or getattr(сущность, 'first_name', '???')
-                диалоги.append((название, str(сущность.id)))
+        await self._обновить_индекс()
+        поиск = self._индекс_поиска(тип)
 
-        if not диалоги:
+        if not len(поиск):
             CONSOLE.print(Panel(f"{EMOJI['внимание']} Нет подходящих чатов.", border_style="yellow"))
             return None
 
-        варианты = [f"{название} (ID: {id_})" for название, id_ in диалоги] + ["Отмена"]
-        выбранный = await questionary.select("Выберите чат:", choices=варианты, style=CUSTOM_STYLE).ask_async()
-        if выбранный == "Отмена":
+        def проверить(текст: str):
+            if not текст.strip() or поиск.найти(текст, лимит=1):
+                return True
+            return "Ничего не найдено"
+
+        # choices нужны questionary только без собственного completer, поэтому передаём короткий список
+        выбранный = await questionary.autocomplete(
+            f"Начните вводить название или ID ({len(поиск)} чатов, пусто — отмена):",
+            choices=[str(id_) for id_ in поиск.ids[:ИндексПоиска.ЛИМИТ]],
+            completer=создать_дополнение_чатов(поиск),
+            validate=проверить,
+            style=CUSTOM_STYLE
+        ).ask_async()
+        if not выбранный or not выбранный.strip():
             return None
-        совпадение = re.search(r'ID:\s*(\d+)', выбранный)
-        return совпадение.group(1) if совпадение else None
+        # Принятое дополнение — это сам ID; если пользователь ввёл текст вручную, берём лучшее совпадение
+        id_ = поиск.найти_id(выбранный)
+        if id_ is None:
+            id_ = поиск.ids[поиск.найти(выбранный, лимит=1)[0]]
+        return str(id_)
+
+    def _индекс_поиска(self, тип: str) -> ИндексПоиска:
+        версия, поиск = self._поиск.get(тип, (None, None))
+        if поиск is None or версия != self.индекс.версия(тип):
+            поиск = ИндексПоиска(self.индекс.записи(тип))
+            self._поиск[тип] = (self.индекс.версия(тип), поиск)
+        return поиск
 
     async def _получить_сообщение_для_спама(self) -> Optional[str]:
         источник = await questionary.select("Источник сообщения:", choices=[
@@ -497,25 +2084,14 @@ class ПриложениеТелеграм:
         await asyncio.sleep(1.5)
 
     async def выполнить_массовое_действие(self, тип_действия: str):
-        # Получаем список целей
-        цели = []
-        if тип_действия in ("рассылка_личные", "удалить_личные"):
-            async for диалог in self.клиент.iter_dialogs():
-                if isinstance(диалог.entity, User) and not диалог.entity.bot and not диалог.entity.is_self:
-                    цели.append(диалог.id)
-        elif тип_действия in ("рассылка_группы", "покинуть_группы"):
-            async for диалог in self.клиент.iter_dialogs():
-                сущность = диалог.entity
-                if isinstance(сущность, Chat) or (isinstance(сущность, Channel) and сущность.megagroup):
-                    цели.append(диалог.id)
-        elif тип_действия == "покинуть_каналы":
-            async for диалог in self.клиент.iter_dialogs():
-                if isinstance(диалог.entity, Channel) and not диалог.entity.megagroup:
-                    цели.append(диалог.id)
-        elif тип_действия == "удалить_ботов":
-            async for диалог in self.клиент.iter_dialogs():
-                if isinstance(диалог.entity, User) and диалог.entity.bot:
-                    цели.append(диалог.id)
+        # Получаем список целей из индекса
+        типы_целей = {
+            "рассылка_личные": "личные", "удалить_личные": "личные",
+            "рассылка_группы": "группы", "покинуть_группы": "группы",
+            "покинуть_каналы": "каналы", "удалить_ботов": "боты",
+        }
+        await self._обновить_индекс()
+        цели = self.индекс.идентификаторы(типы_целей[тип_действия])
 
         if not цели:
             CONSOLE.print(Panel(f"{EMOJI['внимание']} Нет подходящих чатов для действия.", border_style="yellow"))
@@ -536,7 +2112,54 @@ class ПриложениеТелеграм:
         elif тип_действия.startswith("удалить"):
             if not await questionary.confirm(f"Удалить {len(цели)} чатов?", style=CUSTOM_STYLE).ask_async():
                 return
-            await self._удалить_чаты(цели)
+            архив = await questionary.confirm(
+                "Сохранить историю чатов в архив перед удалением?", default=False, style=CUSTOM_STYLE
+            ).ask_async()
+            await self._удалить_чаты(цели, архив=архив)
+
+    async def очистить_по_фильтру(self):
+        CONSOLE.print(Panel(
+            "Поля: kind (channel, group, private, bot), title (=, ~ подстрока, =~ регулярка), "
+            "last_activity (>180d, <12h), unread, muted, bot, megagroup, id\n"
+            "Пример: kind=channel and last_activity>180d and unread=0",
+            title="Фильтр", border_style="cyan"
+        ))
+        await self._обновить_индекс()
+        while True:
+            текст = await questionary.text("Запрос (пусто — отмена):", style=CUSTOM_STYLE).ask_async()
+            if not текст or not текст.strip():
+                return
+            try:
+                фильтр = Фильтр(текст)
+            except ValueError as e:
+                CONSOLE.print(f"{EMOJI['ошибка']} {e}")
+                continue
+            количество = self.индекс.количество_по_фильтру(фильтр)
+            if not количество:
+                CONSOLE.print(f"{EMOJI['внимание']} Под запрос не попал ни один чат")
+                continue
+            break
+
+        названия = {'каналы': "Канал", 'группы': "Группа", 'личные': "Личный", 'боты': "Бот"}
+        таблица = Table(title=f"Под запрос попало чатов: {количество}", box=box.ROUNDED, header_style="bold magenta")
+        таблица.add_column("ID", justify="right")
+        таблица.add_column("Название", max_width=CONSOLE.width - 50)
+        таблица.add_column("Тип")
+        таблица.add_column("Активность")
+        for запись in self.индекс.записи_по_фильтру(фильтр, 10):
+            когда = datetime.fromtimestamp(запись.дата).strftime('%Y-%m-%d') if запись.дата else "—"
+            таблица.add_row(str(запись.id), запись.название, названия[запись.тип], когда)
+        if количество > 10:
+            таблица.caption = f"и ещё {количество - 10}, сначала самые давние"
+        CONSOLE.print(таблица)
+
+        if not await questionary.confirm(f"Покинуть/удалить {количество} чатов?", default=False, style=CUSTOM_STYLE).ask_async():
+            return
+        архив = await questionary.confirm(
+            "Сохранить историю чатов в архив перед удалением?", default=False, style=CUSTOM_STYLE
+        ).ask_async()
+        цели = self.индекс.идентификаторы_по_фильтру(фильтр)
+        await self._удалить_чаты(цели, журнал=ЖурналОчистки.создать(self.аккаунт.имя_сессии, "очистить", цели, архив))
 
     async def _рассылка(self, цели: List[int], сообщение: str):
         CONSOLE.print(Panel(f"{EMOJI['рассылка']} [cyan]Начинаю рассылку...[/cyan]", border_style="cyan"))
@@ -556,34 +2179,175 @@ class ПриложениеТелеграм:
         CONSOLE.print(Panel(f"{EMOJI['успех']} Рассылка завершена. Успешно: {успешных}/{len(цели)}", border_style="green"))
         await asyncio.sleep(2)
 
-    async def _покинуть_чаты(self, цели: List[int]):
-        CONSOLE.print(Panel(f"{EMOJI['выход']} [yellow]Покидаем чаты...[/yellow]", border_style="yellow"))
-        успешных = 0
-        for idx, цель in enumerate(цели, 1):
-            try:
-                await self.клиент.delete_dialog(цель)
-                успешных += 1
-                CONSOLE.print(f"[{idx}/{len(цели)}] Покинут {цель}")
-            except Exception as e:
-                CONSOLE.print(f"{EMOJI['ошибка']} Ошибка при выходе из {цель}: {e}")
-            await asyncio.sleep(1)
-        CONSOLE.print(Panel(f"{EMOJI['успех']} Выход завершён. Успешно: {успешных}/{len(цели)}", border_style="green"))
+    async def _покинуть_чаты(self, цели: List[int], журнал: Optional[ЖурналОчистки] = None):
+        журнал = журнал or ЖурналОчистки.создать(self.аккаунт.имя_сессии, "покинуть", цели)
+        await self._очистить(журнал, f"{EMOJI['выход']} Покидаем чаты")
+        self._показать_отчёт(журнал, "Выход завершён")
         await asyncio.sleep(2)
 
-    async def _удалить_чаты(self, цели: List[int]):
-        CONSOLE.print(Panel(f"{EMOJI['удалить']} [red]Удаляем чаты...[/red]", border_style="red"))
-        успешных = 0
-        for idx, цель in enumerate(цели, 1):
-            try:
-                await self.клиент.delete_dialog(цель)
-                успешных += 1
-                CONSOLE.print(f"[{idx}/{len(цели)}] Удалён {цель}")
-            except Exception as e:
-                CONSOLE.print(f"{EMOJI['ошибка']} Ошибка при удалении {цель}: {e}")
-            await asyncio.sleep(1)
-        CONSOLE.print(Panel(f"{EMOJI['успех']} Удаление завершено. Успешно: {успешных}/{len(цели)}", border_style="green"))
+    async def _удалить_чаты(self, цели: List[int], журнал: Optional[ЖурналОчистки] = None, архив: bool = False):
+        журнал = журнал or ЖурналОчистки.создать(self.аккаунт.имя_сессии, "удалить", цели, архив)
+        await self._очистить(журнал, f"{EMOJI['удалить']} Удаляем чаты")
+        self._показать_отчёт(журнал, "Удаление завершено")
         await asyncio.sleep(2)
 
+    async def _очистить(self, журнал: ЖурналОчистки, заголовок: str) -> int:
+        цели = журнал.оставшиеся()
+        архив = АрхивЧатов(self.аккаунт.имя_сессии) if журнал.архив else None
+        регулятор = РегуляторСкорости(клиент=self.клиент)
+        панель = ПанельОчистки(заголовок, len(цели), журнал.путь.with_suffix('.errors.log'), регулятор)
+
+        def при_результате(цель: int, ошибка: Optional[Exception]):
+            журнал.записать(цель, ошибка)
+            if ошибка:
+                панель.ошибка(цель, ошибка)
+            else:
+                self.индекс.удалить(цель)
+                self._удалены_очисткой[цель] = time.monotonic()
+                панель.успех()
+
+        очистить = создать_операцию_очистки(self.клиент, архив)
+
+        async def операция(цель: int):
+            # UpdateChannel о нашем выходе может прийти раньше, чем результат вызова
+            self._удалены_очисткой[цель] = time.monotonic()
+            await очистить(цель)
+
+        try:
+            with МЕТРИКИ.действие('очистка'), панель:
+                успешных, _ = await регулятор.выполнить(цели, операция, при_результате, панель.пауза)
+        finally:
+            журнал.закрыть()
+        журнал.завершить()
+        if архив:
+            CONSOLE.print(f"{EMOJI['информация']} Сохранено сообщений: {архив.сообщений} → {архив.каталог}")
+        return успешных
+
+    def _показать_отчёт(self, журнал: ЖурналОчистки, заголовок: str):
+        отчёт = журнал.отчёт()
+        CONSOLE.print(Panel(
+            f"{EMOJI['успех']} {заголовок}. Успешно: {отчёт['готово']}/{отчёт['всего']}, "
+            f"ошибок: {отчёт['ошибок']}, не обработано: {отчёт['осталось']}\n"
+            f"Журнал: {журнал.путь}" + (f"\nОшибки: {журнал.путь.with_suffix('.errors.log')}" if отчёт['ошибок'] else ""),
+            border_style="green" if not отчёт['ошибок'] else "yellow"
+        ))
+        if отчёт['ошибки']:
+            таблица = Table(title="Ошибки", box=box.ROUNDED, header_style="bold red")
+            таблица.add_column("ID", justify="right")
+            таблица.add_column("Последняя ошибка", max_width=CONSOLE.width - 25)
+            for id_, ошибка in list(отчёт['ошибки'].items())[:20]:
+                таблица.add_row(str(id_), ошибка)
+            if len(отчёт['ошибки']) > 20:
+                таблица.caption = f"и ещё {len(отчёт['ошибки']) - 20}"
+            CONSOLE.print(таблица)
+
+    async def _предложить_возобновление(self):
+        названия = {"покинуть": "выход из чатов", "удалить": "удаление чатов", "очистить": "очистка по фильтру"}
+        for журнал in ЖурналОчистки.незавершённые(self.аккаунт.имя_сессии):
+            отчёт = журнал.отчёт()
+            когда = datetime.fromtimestamp(журнал.создан).strftime('%Y-%m-%d %H:%M')
+            CONSOLE.print(Panel(
+                f"{EMOJI['внимание']} Незавершённое задание от {когда}: {названия.get(журнал.действие, журнал.действие)}\n"
+                f"Обработано {отчёт['всего'] - отчёт['осталось']}/{отчёт['всего']}, ошибок: {отчёт['ошибок']}",
+                border_style="yellow"
+            ))
+            выбор = await questionary.select("Что сделать с заданием?", choices=[
+                {"name": "Продолжить", "value": "продолжить"},
+                {"name": "Отложить", "value": None},
+                {"name": "Отменить", "value": "отменить"},
+            ], style=CUSTOM_STYLE).ask_async()
+            if выбор == "продолжить":
+                метод = self._покинуть_чаты if журнал.действие == "покинуть" else self._удалить_чаты
+                await метод(журнал.оставшиеся(), журнал=журнал)
+            elif выбор == "отменить":
+                журнал.завершить(отменён=True)
+
+class ПулКлиентов:
+    # Подключённые приложения по имени сессии. При смене аккаунта клиент, get_me и индекс диалогов
+    # (с живой подпиской) остаются готовыми; сверх лимита отключается самый давно использованный
+    def __init__(self, размер: int = 3):
+        self.размер = размер
+        self._приложения: OrderedDict = OrderedDict()
+        self._подключения: Dict[str, asyncio.Task] = {}
+        self.ошибки_прогрева: Dict[str, str] = {}
+
+    async def получить(self, аккаунт: Аккаунт) -> Optional[ПриложениеТелеграм]:
+        имя = аккаунт.имя_сессии
+        if имя in self._подключения:
+            # Сессия уже прогревается в фоне: второй клиент на том же файле сессии открывать нельзя
+            with CONSOLE.status("Подключение к Telegram..."):
+                await asyncio.wait([self._подключения[имя]])
+        приложение = self._приложения.get(имя)
+        if приложение is not None and not приложение.клиент.is_connected():
+            await self.закрыть(имя)
+            приложение = None
+        if приложение is None:
+            приложение = ПриложениеТелеграм(аккаунт)
+            ошибка = self.ошибки_прогрева.pop(имя, None)
+            if ошибка:
+                приложение.предупреждение = f"Фоновое подключение не удалось: {ошибка}"
+            if not await приложение.подключиться():
+                await приложение.закрыть()
+                return None
+            self._приложения[имя] = приложение
+        self._приложения.move_to_end(имя)
+        await self._вытеснить()
+        return приложение
+
+    def прогреть(self, аккаунты: List[Аккаунт]):
+        # В фоне подключаем аккаунты с файлом сессии, пока в пуле есть место
+        for аккаунт in аккаунты:
+            имя = аккаунт.имя_сессии
+            if len(self._приложения) + len(self._подключения) >= self.размер:
+                break
+            if имя in self._приложения or имя in self._подключения:
+                continue
+            if not (SESSIONS_DIR / f"{имя}.session").exists():
+                continue
+            self._подключения[имя] = asyncio.create_task(self._прогреть(аккаунт))
+
+    async def _прогреть(self, аккаунт: Аккаунт):
+        приложение = ПриложениеТелеграм(аккаунт)
+        готово = False
+        try:
+            готово = await приложение.прогреть()
+            if not готово:
+                self.ошибки_прогрева[аккаунт.имя_сессии] = "сессия не авторизована"
+        except Exception as e:
+            self.ошибки_прогрева[аккаунт.имя_сессии] = f"{type(e).__name__}: {e}"
+        finally:
+            self._подключения.pop(аккаунт.имя_сессии, None)
+            if готово:
+                # Прогретые, но ещё не выбранные аккаунты вытесняются первыми
+                self._приложения[аккаунт.имя_сессии] = приложение
+                self._приложения.move_to_end(аккаунт.имя_сессии, last=False)
+            else:
+                await приложение.закрыть()
+
+    async def _вытеснить(self):
+        лишних = len(self._приложения) - self.размер
+        for имя in list(self._приложения):
+            if лишних <= 0:
+                break
+            # Приложение с запущенным спамом продолжает работать в фоне
+            if self._приложения[имя].контроллер_спама.запущен:
+                continue
+            await self.закрыть(имя)
+            лишних -= 1
+
+    async def закрыть(self, имя_сессии: str):
+        задача = self._подключения.pop(имя_сессии, None)
+        if задача:
+            задача.cancel()
+            await asyncio.wait([задача])
+        приложение = self._приложения.pop(имя_сессии, None)
+        if приложение:
+            await приложение.закрыть()
+
+    async def закрыть_все(self):
+        for имя in list(self._подключения) + list(self._приложения):
+            await self.закрыть(имя)
+
 async def основная_функция():
     баннер = создать_3d_баннер()
     описание = f"[bold #29b6f6]           [🧨] Инструмент для массовых рассылок и спама в Telegram [🧨][/bold #29b6f6]"
@@ -595,21 +2359,200 @@ async def основная_функция():
     полный_баннер = f"{баннер}\n{описание}"
     CONSOLE.print(Panel(полный_баннер, style="bold #0288d1", padding=(1, 2)))
 
-    менеджер = МенеджерАккаунтов()
-    while True:
-        аккаунт = await менеджер.выбрать()
-        if not аккаунт:
-            sys.exit(0)
+    пул = ПулКлиентов()
+    менеджер = МенеджерАккаунтов(пул)
+    пул.прогреть(менеджер.аккаунты)
+    try:
+        while True:
+            аккаунт = await менеджер.выбрать()
+            if not аккаунт:
+                sys.exit(0)
 
-        приложение = ПриложениеТелеграм(аккаунт)
-        if await приложение.подключиться():
-            await приложение.запустить()
-        else:
-            await asyncio.sleep(2)
+            приложение = await пул.получить(аккаунт)
+            if приложение:
+                await приложение.запустить()
+            else:
+                await asyncio.sleep(2)
+    finally:
+        await пул.закрыть_все()
+
+КОМАНДНЫЕ_ТИПЫ = {'channels': 'каналы', 'groups': 'группы', 'private': 'личные', 'bots': 'боты'}
+ТИПЫ_ДЛЯ_ВЫВОДА = {тип: имя for имя, тип in КОМАНДНЫЕ_ТИПЫ.items()}
+
+def разобрать_аргументы(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    парсер = argparse.ArgumentParser(
+        description="Управление Telegram-аккаунтом. Без команды запускается интерактивное меню."
+    )
+    парсер.add_argument('--account', help="телефон аккаунта из accounts.json (можно не указывать, если аккаунт один)")
+    команды = парсер.add_subparsers(dest='команда')
+
+    список = команды.add_parser('list', help="вывести диалоги одного типа из индекса")
+    список.add_argument('тип', choices=КОМАНДНЫЕ_ТИПЫ, metavar='{channels,groups,private,bots}')
+    список.add_argument('--json', action='store_true', help="вывод в JSON")
+    список.add_argument('--sync', action='store_true', help="обновить индекс из Telegram перед выводом")
+
+    статистика = команды.add_parser('stats', help="сводка по диалогам, давность активности и неактивные чаты")
+    статистика.add_argument('--json', action='store_true', help="вывод в JSON")
+    статистика.add_argument('--inactive', type=int, default=180, metavar='DAYS', help="порог неактивности в днях (180)")
+    статистика.add_argument('--top', type=int, default=50, help="сколько самых давних неактивных чатов вывести (50)")
+    статистика.add_argument('--sync', action='store_true', help="обновить индекс из Telegram перед выводом")
+
+    экспорт = команды.add_parser('export', help="выгрузить индекс диалогов в файл")
+    экспорт.add_argument('формат', choices=ФОРМАТЫ_ЭКСПОРТА, metavar='{jsonl,csv,parquet}')
+    экспорт.add_argument('путь', type=Path, metavar='PATH')
+    экспорт.add_argument('--kind', choices=КОМАНДНЫЕ_ТИПЫ, help="только диалоги одного типа")
+    экспорт.add_argument('--sync', action='store_true', help="обновить индекс из Telegram перед выгрузкой")
+
+    очистка = команды.add_parser('cleanup', help="покинуть каналы/группы или удалить личные чаты/ботов")
+    очистка.add_argument('тип', nargs='?', choices=КОМАНДНЫЕ_ТИПЫ, metavar='{channels,groups,private,bots}')
+    очистка.add_argument(
+        '--query', metavar='Q', help="фильтр, например: \"kind=channel and last_activity>180d and unread=0\""
+    )
+    очистка.add_argument('--yes', action='store_true', help="выполнить без подтверждения (иначе только показать количество)")
+    очистка.add_argument('--archive', action='store_true', help="перед удалением сохранить историю каждого чата в sessions/archive")
+    return парсер.parse_args(argv)
+
+def выбрать_аккаунт(телефон: Optional[str]) -> Аккаунт:
+    аккаунты = загрузить_аккаунты()
+    if телефон:
+        for акк in аккаунты:
+            if акк.телефон.replace(' ', '') == телефон.replace(' ', ''):
+                return акк
+        raise SystemExit(f"Аккаунт {телефон} не найден в {ACCOUNTS_FILE}")
+    if len(аккаунты) != 1:
+        raise SystemExit(f"В {ACCOUNTS_FILE} {len(аккаунты)} аккаунтов, укажите нужный через --account")
+    return аккаунты[0]
+
+async def подключить_без_интерфейса(аккаунт: Аккаунт) -> 'ПриложениеТелеграм':
+    приложение = ПриложениеТелеграм(аккаунт, живой_индекс=False)
+    async with МЕТРИКИ.замер('connect'):
+        await приложение.клиент.connect()
+    if not await приложение.клиент.is_user_authorized():
+        await приложение.клиент.disconnect()
+        raise SystemExit(f"Сессия {аккаунт.имя_сессии} не авторизована, войдите через интерактивное меню")
+    return приложение
+
+async def выполнить_команду(аргументы: argparse.Namespace) -> int:
+    аккаунт = выбрать_аккаунт(аргументы.account)
+    фильтр = None
+    if аргументы.команда == 'cleanup':
+        if not аргументы.тип and not аргументы.query:
+            raise SystemExit("Укажите тип диалогов или --query")
+        запрос = аргументы.query or f"kind={аргументы.тип}"
+        if аргументы.query and аргументы.тип:
+            запрос = f"kind={аргументы.тип} and ({аргументы.query})"
+        try:
+            фильтр = Фильтр(запрос)
+        except ValueError as e:
+            raise SystemExit(f"Неверный запрос: {e}")
+
+    приложение = None
+    if аргументы.команда == 'cleanup' or аргументы.sync:
+        приложение = await подключить_без_интерфейса(аккаунт)
+        индекс = приложение.индекс
+        with МЕТРИКИ.действие('обновление_индекса'):
+            await индекс.обновить(приложение.клиент)
+    else:
+        путь = SESSIONS_DIR / f"{аккаунт.имя_сессии}.dialogs.db"
+        # Без индекса команды молча выдали бы пустой список, неотличимый от аккаунта без диалогов
+        if not путь.exists():
+            raise SystemExit(f"Индекс диалогов {путь} ещё не создан, запустите команду с --sync")
+        индекс = ИндексДиалогов(путь)
+        if not индекс.синхронизирован():
+            индекс.закрыть()
+            raise SystemExit(f"Индекс диалогов {путь} ни разу не синхронизировался, запустите команду с --sync")
 
-if __name__ == "__main__":
     try:
-        asyncio.run(основная_функция())
-    except KeyboardInterrupt:
-        CONSOLE.print(f"\n{EMOJI['выход']} [bold yellow]Выход по запросу пользователя.[/bold yellow]")
-        sys.exit(0)
+        if аргументы.команда == 'list':
+            записи = индекс.записи(КОМАНДНЫЕ_ТИПЫ[аргументы.тип])
+            if аргументы.json:
+                json.dump([
+                    {"id": з.id, "kind": аргументы.тип, "title": з.название, "unread": з.непрочитано, "last_activity": з.дата}
+                    for з in записи
+                ], sys.stdout, ensure_ascii=False)
+                sys.stdout.write("\n")
+            else:
+                for з in записи:
+                    print(f"{з.id}\t{з.название}")
+
+        elif аргументы.команда == 'stats':
+            статистика = собрать_статистику(индекс, аргументы.inactive, аргументы.top)
+            if аргументы.json:
+                print(json.dumps(статистика, ensure_ascii=False))
+            else:
+                for имя, значения in статистика["kinds"].items():
+                    print(f"{имя}\t{значения['count']}\tunread={значения['unread']}\tmuted={значения['muted']}")
+                for подпись, количество in статистика["activity_age"].items():
+                    print(f"age {подпись}\t{количество}")
+                print(f"inactive>{аргументы.inactive}d\t{статистика['inactive']['count']}")
+                for запись in статистика["inactive"]["top"]:
+                    print(f"{запись['id']}\t{запись['kind']}\t{запись['title']}")
+
+        elif аргументы.команда == 'export':
+            тип = КОМАНДНЫЕ_ТИПЫ[аргументы.kind] if аргументы.kind else None
+            try:
+                всего = экспортировать(индекс.записи(тип), аргументы.путь, аргументы.формат)
+            except RuntimeError as e:
+                print(e, file=sys.stderr)
+                return 1
+            print(json.dumps({"exported": всего, "path": str(аргументы.путь)}, ensure_ascii=False))
+
+        elif аргументы.команда == 'cleanup':
+            if аргументы.тип:
+                действие = "покинуть" if аргументы.тип in ('channels', 'groups') else "удалить"
+            else:
+                действие = "очистить"
+            цели = индекс.идентификаторы_по_фильтру(фильтр)
+            if not аргументы.yes:
+                print(f"{действие}: {len(цели)} ({фильтр.текст}); добавьте --yes, чтобы выполнить")
+                return 0
+            журнал = ЖурналОчистки.создать(аккаунт.имя_сессии, действие, цели, аргументы.archive)
+            архив = АрхивЧатов(аккаунт.имя_сессии) if аргументы.archive else None
+
+            def при_результате(цель: int, ошибка: Optional[Exception]):
+                журнал.записать(цель, ошибка)
+                if ошибка:
+                    print(f"{цель}\tошибка\t{ошибка}", file=sys.stderr)
+                else:
+                    индекс.удалить(цель)
+
+            try:
+                with МЕТРИКИ.действие('очистка'):
+                    await РегуляторСкорости(клиент=приложение.клиент).выполнить(
+                        цели, создать_операцию_очистки(приложение.клиент, архив), при_результате
+                    )
+            finally:
+                журнал.закрыть()
+            журнал.завершить()
+            отчёт = журнал.отчёт()
+            итог = {к: з for к, з in отчёт.items() if к != "ошибки"}
+            if архив:
+                итог.update(archived_messages=архив.сообщений, archive=str(архив.каталог))
+            print(json.dumps(итог, ensure_ascii=False))
+            return 1 if отчёт['ошибок'] else 0
+    finally:
+        if приложение:
+            await приложение.клиент.disconnect()
+        индекс.закрыть()
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    аргументы = разобрать_аргументы(argv)
+    try:
+        if аргументы.команда:
+            try:
+                return asyncio.run(выполнить_команду(аргументы))
+            except KeyboardInterrupt:
+                return 130
+
+        загрузить_интерфейс()
+        try:
+            asyncio.run(основная_функция())
+        except KeyboardInterrupt:
+            CONSOLE.print(f"\n{EMOJI['выход']} [bold yellow]Выход по запросу пользователя.[/bold yellow]")
+        return 0
+    finally:
+        МЕТРИКИ.сохранить(команда=аргументы.команда or "меню")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import asyncio
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import program
+from program import АрхивЧатов, ЖурналОчистки, ЗаписьДиалога, ИндексДиалогов, Фильтр
+
+ДЕНЬ = 86400
+
+
+@pytest.fixture
+def индекс(tmp_path):
+    индекс = ИндексДиалогов(tmp_path / 'test.dialogs.db')
+    yield индекс
+    индекс.закрыть()
+
+
+def заполнить(индекс, записи):
+    индекс._записать(записи)
+    индекс._зафиксировать()
+
+
+def проверить_агрегаты(индекс):
+    бд = индекс.бд
+    assert sorted(бд.execute("SELECT * FROM stats_kind WHERE count > 0")) == sorted(бд.execute(
+        "SELECT kind, COUNT(*), SUM(unread), SUM(muted) FROM dialogs GROUP BY kind"
+    ))
+    assert sorted(бд.execute("SELECT * FROM stats_day")) == sorted(бд.execute(
+        "SELECT kind, CAST(date / 86400 AS INTEGER), COUNT(*) FROM dialogs GROUP BY 1, 2"
+    ))
+
+
+def test_фильтр_выбирает_нужные_строки(индекс):
+    сейчас = time.time()
+    заполнить(индекс, [
+        ЗаписьДиалога(1, 'каналы', 'Новости', дата=сейчас - 400 * ДЕНЬ),
+        ЗаписьДиалога(2, 'каналы', 'Свежие новости', непрочитано=3, дата=сейчас - ДЕНЬ),
+        ЗаписьДиалога(3, 'каналы', 'Без сообщений', дата=0),
+        ЗаписьДиалога(4, 'группы', 'Старая группа', дата=сейчас - 200 * ДЕНЬ, заглушен=True),
+        ЗаписьДиалога(5, 'боты', 'Bot 42', бот=True, дата=сейчас - 10 * ДЕНЬ),
+        ЗаписьДиалога(6, 'личные', 'Иван', дата=сейчас - 500 * ДЕНЬ),
+    ])
+
+    def выбрать(текст):
+        return sorted(индекс.идентификаторы_по_фильтру(Фильтр(текст)))
+
+    assert выбрать("kind=channel") == [1, 2, 3]
+    assert выбрать("kind=channel and last_activity>180d") == [1]
+    assert выбрать("last_activity>180d") == [1, 4, 6]
+    assert выбрать("title~новости and unread=0") == [1]
+    assert выбрать(r"title=~'^Bot \d+$'") == [5]
+    assert выбрать("muted=1 or (kind=private and not id=7)") == [4, 6]
+    assert индекс.количество_по_фильтру(Фильтр("kind!=channel")) == 3
+
+
+def test_агрегаты_совпадают_с_group_by(индекс):
+    сейчас = time.time()
+    заполнить(индекс, [
+        ЗаписьДиалога(i, ('каналы', 'группы', 'личные')[i % 3], f"Чат {i}", непрочитано=i % 4,
+                      дата=0 if i % 10 == 0 else сейчас - i * ДЕНЬ, заглушен=i % 5 == 0)
+        for i in range(1, 61)
+    ])
+    проверить_агрегаты(индекс)
+
+    # Повторная запись тех же id идёт через upsert и меняет тип, дату и счётчики
+    заполнить(индекс, [
+        ЗаписьДиалога(i, 'боты', f"Чат {i}", бот=True, непрочитано=7, дата=сейчас - 3 * i * ДЕНЬ)
+        for i in range(1, 31, 2)
+    ])
+    индекс.отметить_сообщение(2, сейчас, входящее=True)
+    индекс.отметить_прочитанным(4)
+    проверить_агрегаты(индекс)
+
+    for id_ in range(1, 61, 4):
+        индекс.удалить(id_)
+    проверить_агрегаты(индекс)
+    assert индекс.бд.execute("SELECT COUNT(*) FROM stats_day WHERE count <= 0").fetchone()[0] == 0
+
+
+def test_количество_неактивных_по_дням(индекс):
+    сегодня = int(time.time() // ДЕНЬ)
+    заполнить(индекс, [
+        ЗаписьДиалога(1, 'каналы', 'a', дата=(сегодня - 200) * ДЕНЬ),
+        ЗаписьДиалога(2, 'группы', 'b', дата=(сегодня - 181) * ДЕНЬ),
+        ЗаписьДиалога(3, 'группы', 'c', дата=(сегодня - 10) * ДЕНЬ),
+        ЗаписьДиалога(4, 'каналы', 'd', дата=0),
+    ])
+    assert индекс.количество_неактивных(180) == 2
+
+
+def test_журнал_с_оборванной_строкой(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    журнал = ЖурналОчистки.создать('s1', 'удалить', [1, 2, 3])
+    журнал.записать(1)
+    журнал.записать(2, ValueError("нет доступа"))
+    журнал.закрыть()
+    with журнал.путь.open('a', encoding='utf-8') as f:
+        f.write('{"тип": "цель", "id": 3, "ста')
+
+    загруженный = ЖурналОчистки.загрузить(журнал.путь)
+    assert загруженный.цели == [1, 2, 3]
+    assert загруженный.статусы == {1: "готово", 2: "ошибка"}
+    assert загруженный.ошибки == {2: "ValueError: нет доступа"}
+    assert [ж.путь for ж in ЖурналОчистки.незавершённые('s1')] == [журнал.путь]
+
+    # Продолжение дописывает записи с новой строки, не склеивая их с оборванной
+    загруженный.записать(3)
+    загруженный.завершить()
+    архивный = program.JOURNALS_DIR / 'done' / журнал.путь.name
+    assert not журнал.путь.exists()
+    итог = ЖурналОчистки.загрузить(архивный)
+    assert итог.завершён
+    assert итог.статусы == {1: "готово", 2: "ошибка", 3: "готово"}
+    assert ЖурналОчистки.незавершённые('s1') == []
+
+
+class КлиентИстории:
+    def __init__(self, сообщений: int, сбой_на_вызове: int = 0):
+        self.сообщений = сообщений
+        self.сбой_на_вызове = сбой_на_вызове
+        self.вызовов = 0
+
+    async def get_messages(self, цель, limit, offset_id, reverse):
+        self.вызовов += 1
+        if self.вызовов == self.сбой_на_вызове:
+            raise ConnectionError("обрыв")
+        return [
+            SimpleNamespace(id=i, date=None, sender_id=цель, reply_to_msg_id=None, message=f"сообщение {i}", media=None)
+            for i in range(offset_id + 1, min(self.сообщений, offset_id + limit) + 1)
+        ]
+
+
+def прочитать_архив(архив, id_):
+    with gzip.open(архив.путь(id_), 'rt', encoding='utf-8') as f:
+        return [json.loads(строка)["id"] for строка in f]
+
+
+def test_архив_обрезает_хвост_и_продолжает(tmp_path):
+    архив = АрхивЧатов('s1', размер_страницы=10)
+    архив.каталог = tmp_path
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(архив.сохранить(КлиентИстории(35, сбой_на_вызове=3), 7))
+    assert json.loads((tmp_path / "7.state").read_text(encoding='utf-8'))["last_id"] == 20
+
+    # Страница, дописанная до падения, но не попавшая в состояние
+    with архив.путь(7).open('ab') as f:
+        f.write(gzip.compress(b'{"id": 21}\n')[:15])
+
+    assert asyncio.run(архив.сохранить(КлиентИстории(35), 7)) == 15
+    assert прочитать_архив(архив, 7) == list(range(1, 36))
+
+    # Чат пополнился после прошлого удаления: дописываются только новые сообщения
+    assert asyncio.run(архив.сохранить(КлиентИстории(38), 7)) == 3
+    assert прочитать_архив(архив, 7) == list(range(1, 39))